@@ -1,9 +1,109 @@
+import json
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Extra keys (comma-separated) to spread load over; each has its own quota.
+GROQ_API_KEYS = [key.strip() for key in os.getenv("GROQ_API_KEYS", "").split(",") if key.strip()]
 
-if not GROQ_API_KEY:
-    raise RuntimeError("GROQ_API_KEY is missing")
+# Chunk summaries go to the small, fast model; notes, flashcards and quizzes
+# to the generation model.
+GROQ_SUMMARY_MODEL = os.getenv("GROQ_SUMMARY_MODEL", "llama-3.1-8b-instant").strip()
+GROQ_GENERATION_MODEL = os.getenv("GROQ_GENERATION_MODEL", "llama-3.1-8b-instant").strip()
+
+# Optional explicit pool as JSON, overriding the keys and models above:
+# [{"api_key": "...", "model": "llama-3.3-70b-versatile", "rpm": 30, "tpm": 12000}, ...]
+GROQ_POOL = os.getenv("GROQ_POOL", "").strip()
+
+
+def groq_pool_specs() -> list:
+    """One dict per Groq pool member: api_key, model, rpm and tpm."""
+    if GROQ_POOL:
+        specs = json.loads(GROQ_POOL)
+        if not isinstance(specs, list):
+            raise ValueError("GROQ_POOL must be a JSON list")
+        return [
+            {
+                "api_key": spec["api_key"],
+                "model": spec.get("model", GROQ_GENERATION_MODEL),
+                "rpm": max(1, int(spec.get("rpm", GROQ_RPM))),
+                "tpm": max(1, int(spec.get("tpm", GROQ_TPM))),
+            }
+            for spec in specs
+        ]
+    keys = list(dict.fromkeys(([GROQ_API_KEY] if GROQ_API_KEY else []) + GROQ_API_KEYS))
+    models = list(dict.fromkeys([GROQ_SUMMARY_MODEL, GROQ_GENERATION_MODEL]))
+    return [
+        {"api_key": key, "model": model, "rpm": GROQ_RPM, "tpm": GROQ_TPM}
+        for key in keys
+        for model in models
+    ]
+
+
+def validate_config() -> None:
+    # Called from the app's lifespan, so importing the app never fails on config.
+    try:
+        specs = groq_pool_specs()
+    except (ValueError, KeyError, TypeError) as e:
+        raise RuntimeError(f"GROQ_POOL is invalid: {e!r}") from e
+    if not specs:
+        raise RuntimeError("GROQ_API_KEY is missing")
+
+# Max chunk-summary LLM calls in flight at once (shared across requests).
+SUMMARY_CONCURRENCY = max(1, int(os.getenv("SUMMARY_CONCURRENCY", "4")))
+
+# Pooled HTTP connections to the Groq API per worker process.
+GROQ_MAX_CONNECTIONS = max(1, int(os.getenv("GROQ_MAX_CONNECTIONS", "100")))
+GROQ_TIMEOUT_SECONDS = float(os.getenv("GROQ_TIMEOUT_SECONDS", "60"))
+
+# In-memory cache budget shared by transcripts and generated artifacts.
+CACHE_MAX_BYTES = int(float(os.getenv("CACHE_MAX_MB", "256")) * 1024 * 1024)
+TRANSCRIPT_CACHE_TTL_SECONDS = float(os.getenv("TRANSCRIPT_CACHE_TTL_SECONDS", str(24 * 3600)))
+ARTIFACT_CACHE_TTL_SECONDS = float(os.getenv("ARTIFACT_CACHE_TTL_SECONDS", str(6 * 3600)))
+
+# Optional SQLite file shared by all workers; empty disables persistence.
+STORE_PATH = os.getenv("STORE_PATH", "").strip()
+
+# Transcripts over this many times the direct prompt budget are reduced to
+# their most representative passages locally and summarized in one LLM call;
+# shorter long ones are summarized chunk by chunk.
+EXTRACTIVE_SUMMARY_RATIO = max(1.0, float(os.getenv("EXTRACTIVE_SUMMARY_RATIO", "2")))
+
+# Largest single Groq request (prompt + reply) in tokens. Groq rejects requests
+# above the key's tokens-per-minute limit with 413, so match it to your tier.
+GROQ_MAX_REQUEST_TOKENS = max(1024, int(os.getenv("GROQ_MAX_REQUEST_TOKENS", "6000")))
+
+# Client-side Groq quota per API key and model. RATE_LIMIT_SHARED=1 keeps the buckets in
+# the STORE_PATH database so all worker processes share one quota.
+GROQ_RPM = max(1, int(os.getenv("GROQ_RPM", "30")))
+GROQ_TPM = max(1, int(os.getenv("GROQ_TPM", "6000")))
+RATE_LIMIT_SHARED = os.getenv("RATE_LIMIT_SHARED", "").strip().lower() in ("1", "true", "yes")
+
+# Background job pool for long videos (see /api/jobs).
+JOB_WORKERS = max(1, int(os.getenv("JOB_WORKERS", "2")))
+JOB_QUEUE_MAX = max(1, int(os.getenv("JOB_QUEUE_MAX", "100")))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+# Start the yt-dlp transcript fallback this long after youtube-transcript-api
+# if the latter has not answered yet; remember the winning source per video.
+TRANSCRIPT_HEDGE_DELAY_SECONDS = float(os.getenv("TRANSCRIPT_HEDGE_DELAY_SECONDS", "1.5"))
+TRANSCRIPT_SOURCE_TTL_SECONDS = float(os.getenv("TRANSCRIPT_SOURCE_TTL_SECONDS", "900"))
+
+# Fetch yt-dlp subtitle tracks straight into memory instead of via temp files.
+YTDLP_IN_MEMORY_SUBTITLES = os.getenv("YTDLP_IN_MEMORY_SUBTITLES", "1").strip().lower() not in ("0", "false", "no")
+
+# /api/batch: most videos per request, and how many videos fetch transcripts
+# or generate at once across all batches (Groq calls stay rate-limited too).
+BATCH_MAX_VIDEOS = max(1, int(os.getenv("BATCH_MAX_VIDEOS", "100")))
+BATCH_FETCH_CONCURRENCY = max(1, int(os.getenv("BATCH_FETCH_CONCURRENCY", "4")))
+BATCH_GENERATE_CONCURRENCY = max(1, int(os.getenv("BATCH_GENERATE_CONCURRENCY", "2")))
+
+# Prometheus-style /metrics (timing histograms and counters); LOG_REQUESTS=1
+# also writes one JSON log line per request with its stage timings.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+LOG_REQUESTS = os.getenv("LOG_REQUESTS", "").strip().lower() in ("1", "true", "yes")
+
+# Warm imports, prompt budgets and the Groq connection in the background at startup.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1").strip().lower() not in ("0", "false", "no")
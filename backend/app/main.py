@@ -1,18 +1,73 @@
-from fastapi import FastAPI
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from app.config import WARMUP_ON_STARTUP, validate_config
 from app.routes import router
+from app.services import groq_service, metrics, transcript_service
+from app.services.cache import CACHE
+from app.services.jobs import JOBS
 
-app = FastAPI(title="Study.Sync Backend", version="1.0")
+
+async def _warmup() -> None:
+    with metrics.span(stage="warmup"):
+        await asyncio.gather(
+            groq_service.warmup(),
+            asyncio.to_thread(transcript_service.warmup),
+            return_exceptions=True,
+        )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    validate_config()
+    await JOBS.start()
+    # Runs in the background: the worker takes traffic immediately.
+    warmup = asyncio.create_task(_warmup()) if WARMUP_ON_STARTUP else None
+    yield
+    if warmup is not None:
+        warmup.cancel()
+    await JOBS.stop()
+    await groq_service.close_client()
+    if CACHE.store is not None:
+        # Commit queued store writes so the next worker starts warm.
+        await asyncio.to_thread(CACHE.store.flush)
+
+
+app = FastAPI(title="Study.Sync Backend", version="1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets browser clients read artifact ids for conditional requests.
+    expose_headers=["ETag", "Content-Location"],
 )
 
 app.include_router(router)
 
+
+@app.middleware("http")
+async def record_request(request: Request, call_next):
+    # Streaming responses are timed to their first byte, not the end of the stream.
+    started = time.perf_counter()
+    with metrics.request_log(request.method, request.url.path) as record:
+        response = await call_next(request)
+        record["status"] = response.status_code
+    # The route template keeps label cardinality bounded (no job ids or junk paths).
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.observe("http_request_seconds", time.perf_counter() - started, method=request.method, route=route)
+    metrics.inc("http_requests_total", method=request.method, route=route, status=response.status_code)
+    return response
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return metrics.render()
+
 @app.get("/")
 def health():
     return {"status": "Backend running successfully 🚀"}
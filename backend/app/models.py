@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 class VideoRequest(BaseModel):
     url: Optional[str] = None
@@ -8,8 +8,26 @@ class VideoRequest(BaseModel):
 class Flashcard(BaseModel):
     question: str
     answer: str
+    # "mm:ss" into the video, when the transcript had caption timing.
+    timestamp: Optional[str] = None
 
 class QuizQuestion(BaseModel):
     question: str
     options: List[str]
     correct_answer: str
+
+
+class JobRequest(VideoRequest):
+    outputs: List[Literal["notes", "flashcards", "quiz"]] = ["notes", "flashcards", "quiz"]
+    flashcard_count: int = 10
+    quiz_count: int = 5
+
+
+
+class BatchRequest(BaseModel):
+    urls: List[str] = []
+    # Expanded with yt-dlp and appended after ``urls``.
+    playlist_url: Optional[str] = None
+    outputs: List[Literal["notes", "flashcards", "quiz"]] = ["notes"]
+    flashcard_count: int = 10
+    quiz_count: int = 5
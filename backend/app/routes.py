@@ -1,47 +1,283 @@
-from fastapi import APIRouter, HTTPException
-from app.models import VideoRequest
-from app.services.transcript_service import fetch_transcript_with_fallback, normalize_transcript_text
+import json
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from app.models import BatchRequest, JobRequest, VideoRequest
+from app.services.batch import resolve_batch_urls, run_batch
+from app.services.jobs import JOBS, JobQueueFull
+from app.services.metrics import span
+from app.services.segments import SegmentedTranscript
+from app.services.transcript_service import (
+    extract_video_id,
+    fetch_transcript_with_fallback,
+    normalize_transcript_text,
+    parse_transcript_text,
+)
 from app.services.groq_service import (
+    artifact_key,
+    cached_artifact,
+    clamp_count,
     generate_notes,
     generate_flashcards,
-    generate_quiz
+    generate_quiz,
+    generate_study_pack,
+    stream_notes,
+    transcript_key,
 )
 
 router = APIRouter(prefix="/api")
 
 
-def _resolve_transcript(req: VideoRequest) -> str:
-    transcript = normalize_transcript_text(req.transcript or "")
+async def _resolve_transcript(req: VideoRequest) -> SegmentedTranscript:
+    transcript = parse_transcript_text(req.transcript or "")
     if transcript:
         return transcript
     if not req.url:
         raise HTTPException(status_code=400, detail="URL or transcript is required")
-    return fetch_transcript_with_fallback(req.url)
+    with span(stage="transcript"):
+        return await fetch_transcript_with_fallback(req.url)
 
 
-def _handle_request(req: VideoRequest, build_response):
+async def _handle_request(req: VideoRequest, build_response):
     try:
-        transcript = _resolve_transcript(req)
-        return build_response(transcript)
+        transcript = await _resolve_transcript(req)
+        return await build_response(transcript)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+
+def _etag(kind: str, raw_key: str, count: Optional[int] = None) -> str:
+    return f'"{artifact_key(kind, raw_key, count)}"'
+
+
+async def _not_modified(
+    request: Request, kind: str, raw_key: str, count: Optional[int] = None
+) -> Optional[Response]:
+    # Artifacts are keyed by their input, so a matching tag means the client's
+    # copy is current; "*" only matches an artifact that actually exists.
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    etag = _etag(kind, raw_key, count)
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    if etag in tags or ("*" in tags and await cached_artifact(kind, raw_key, count) is not None):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+async def _artifact_headers(response: Response, kind: str, raw_key: str, count: Optional[int] = None) -> None:
+    # Only a result cached exactly as returned is tagged; a short list or notes
+    # cut off at the token cap would otherwise be pinned by If-None-Match.
+    if await cached_artifact(kind, raw_key, count) is None:
+        return
+    response.headers["ETag"] = _etag(kind, raw_key, count)
+    # Where the same artifact can be fetched later without re-sending the transcript.
+    query = f"?count={clamp_count(kind, count)}" if count is not None else ""
+    response.headers["Content-Location"] = f"/api/{kind}/{raw_key}{query}"
+
+
+async def _cached_response(kind: str, raw_key: str, count: Optional[int], request: Request, response: Response):
+    artifact = await cached_artifact(kind, raw_key, count)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Artifact not cached; POST the transcript to generate it")
+    not_modified = await _not_modified(request, kind, raw_key, count)
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = _etag(kind, raw_key, count)
+    # Browsers keep the copy but revalidate it with If-None-Match.
+    response.headers["Cache-Control"] = "private, no-cache"
+    return {kind: artifact}
+
+
 @router.post("/notes")
-def notes(req: VideoRequest):
-    return _handle_request(req, lambda transcript: {"notes": generate_notes(transcript)})
+async def notes(req: VideoRequest, request: Request, response: Response):
+    async def build(transcript: SegmentedTranscript):
+        raw_key = transcript_key(transcript)
+        not_modified = await _not_modified(request, "notes", raw_key)
+        if not_modified:
+            return not_modified
+        notes = await generate_notes(transcript, raw_key)
+        await _artifact_headers(response, "notes", raw_key)
+        return {"notes": notes}
 
+    return await _handle_request(req, build)
 
-@router.post("/flashcards")
-def flashcards(req: VideoRequest, count: int = 10):
-    return _handle_request(
-        req, lambda transcript: {"flashcards": generate_flashcards(transcript, count)}
+
+@router.get("/notes/{raw_key}")
+async def cached_notes(raw_key: str, request: Request, response: Response):
+    return await _cached_response("notes", raw_key, None, request, response)
+
+
+@router.post("/notes/stream")
+async def notes_stream(req: VideoRequest):
+    # Check the request up front so a malformed one still gets a normal 400;
+    # fetching the transcript waits until the stream has started.
+    transcript = parse_transcript_text(req.transcript or "")
+    if not transcript:
+        if not req.url:
+            raise HTTPException(status_code=400, detail="URL or transcript is required")
+        try:
+            extract_video_id(req.url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        yield _sse("progress", {"stage": "start"})
+        try:
+            resolved = transcript
+            if not resolved:
+                yield _sse("progress", {"stage": "transcript"})
+                with span(stage="transcript"):
+                    resolved = await fetch_transcript_with_fallback(req.url)
+            async for event, data in stream_notes(resolved):
+                yield _sse(event, data)
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/flashcards")
+async def flashcards(
+    req: VideoRequest, request: Request, response: Response, count: int = 10, sample: bool = False
+):
+    async def build(transcript: SegmentedTranscript):
+        raw_key = transcript_key(transcript)
+        if sample:
+            # A random draw has no stable identity to tag.
+            return {"flashcards": await generate_flashcards(transcript, count, raw_key, sample=True)}
+        not_modified = await _not_modified(request, "flashcards", raw_key, count)
+        if not_modified:
+            return not_modified
+        cards = await generate_flashcards(transcript, count, raw_key)
+        await _artifact_headers(response, "flashcards", raw_key, count)
+        return {"flashcards": cards}
+
+    return await _handle_request(req, build)
+
+
+@router.get("/flashcards/{raw_key}")
+async def cached_flashcards(raw_key: str, request: Request, response: Response, count: int = 10):
+    return await _cached_response("flashcards", raw_key, count, request, response)
+
+
 
 @router.post("/quiz")
-def quiz(req: VideoRequest, count: int = 5):
-    return _handle_request(req, lambda transcript: {"quiz": generate_quiz(transcript, count)})
+async def quiz(
+    req: VideoRequest, request: Request, response: Response, count: int = 5, sample: bool = False
+):
+    async def build(transcript: SegmentedTranscript):
+        raw_key = transcript_key(transcript)
+        if sample:
+            return {"quiz": await generate_quiz(transcript, count, raw_key, sample=True)}
+        not_modified = await _not_modified(request, "quiz", raw_key, count)
+        if not_modified:
+            return not_modified
+        questions = await generate_quiz(transcript, count, raw_key)
+        await _artifact_headers(response, "quiz", raw_key, count)
+        return {"quiz": questions}
+
+    return await _handle_request(req, build)
+
 
+@router.get("/quiz/{raw_key}")
+async def cached_quiz(raw_key: str, request: Request, response: Response, count: int = 5):
+    return await _cached_response("quiz", raw_key, count, request, response)
+
+
+@router.post("/study-pack")
+async def study_pack(req: VideoRequest, flashcard_count: int = 10, quiz_count: int = 5):
+    async def build(transcript: SegmentedTranscript):
+        return await generate_study_pack(transcript, flashcard_count, quiz_count)
+
+    return await _handle_request(req, build)
+
+
+@router.post("/batch")
+async def batch(req: BatchRequest):
+    if not (req.urls or req.playlist_url):
+        raise HTTPException(status_code=400, detail="urls or playlist_url is required")
+    if not req.outputs:
+        raise HTTPException(status_code=400, detail="At least one output is required")
+    try:
+        urls = await resolve_batch_urls(req.urls, req.playlist_url)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    outputs = tuple(dict.fromkeys(req.outputs))
+
+    async def lines():
+        # Newline-delimited JSON: a header, one line per video as it finishes, then a summary.
+        yield json.dumps({"event": "start", "total": len(urls), "urls": urls}) + "\n"
+        failed = 0
+        async for item in run_batch(urls, outputs, req.flashcard_count, req.quiz_count):
+            failed += item["status"] == "error"
+            yield json.dumps({"event": "video", **item}, ensure_ascii=False) + "\n"
+        yield json.dumps({"event": "done", "total": len(urls), "failed": failed}) + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/jobs", status_code=202)
+async def submit_job(req: JobRequest):
+    if not (req.url or normalize_transcript_text(req.transcript or "")):
+        raise HTTPException(status_code=400, detail="URL or transcript is required")
+    if not req.outputs:
+        raise HTTPException(status_code=400, detail="At least one output is required")
+    try:
+        job = JOBS.submit(
+            req.url, req.transcript, list(dict.fromkeys(req.outputs)), req.flashcard_count, req.quiz_count
+        )
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return job.snapshot()
+
+
+def _get_job(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    return _get_job(job_id).snapshot()
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    job = _get_job(job_id)
+
+    async def events():
+        version = -1
+        while True:
+            if job.version != version:
+                version = job.version
+                yield _sse("status", job.snapshot())
+                if job.finished:
+                    return
+            else:
+                # Comment line keeps proxies from closing an idle stream.
+                yield ": keep-alive\n\n"
+            await job.wait_for_change(version, timeout=15)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,75 @@
+import asyncio
+from typing import AsyncIterator, List, Optional
+
+from app.config import BATCH_FETCH_CONCURRENCY, BATCH_GENERATE_CONCURRENCY, BATCH_MAX_VIDEOS
+from app.services.groq_service import generate_study_pack
+from app.services.rate_limit import background_priority
+from app.services.transcript_service import extract_video_id, fetch_transcript_with_fallback
+
+# Shared by every batch so concurrent course uploads cannot stack up on YouTube or Groq.
+_FETCH_SEMAPHORE = asyncio.Semaphore(BATCH_FETCH_CONCURRENCY)
+_GENERATE_SEMAPHORE = asyncio.Semaphore(BATCH_GENERATE_CONCURRENCY)
+
+
+def _expand_playlist_blocking(playlist_url: str) -> List[str]:
+    from yt_dlp import YoutubeDL  # type: ignore
+
+    # Flat extraction lists the entries without resolving each video.
+    ydl_opts = {"extract_flat": "in_playlist", "skip_download": True, "quiet": True, "no_warnings": True}
+    with YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(playlist_url, download=False)
+
+    urls = []
+    for entry in info.get("entries") or []:
+        video_id = (entry or {}).get("id")
+        if video_id:
+            urls.append(f"https://www.youtube.com/watch?v={video_id}")
+    return urls
+
+
+async def resolve_batch_urls(urls: List[str], playlist_url: Optional[str] = None) -> List[str]:
+    """Explicit URLs then playlist entries, de-duplicated by video id and capped."""
+    candidates = list(urls)
+    if playlist_url:
+        candidates += await asyncio.to_thread(_expand_playlist_blocking, playlist_url)
+
+    resolved: List[str] = []
+    seen = set()
+    for url in candidates:
+        video_id = extract_video_id(url)
+        if video_id not in seen:
+            seen.add(video_id)
+            resolved.append(url)
+    if len(resolved) > BATCH_MAX_VIDEOS:
+        raise ValueError(f"At most {BATCH_MAX_VIDEOS} videos per batch")
+    return resolved
+
+
+async def _process(index: int, url: str, outputs: tuple, flashcard_count: int, quiz_count: int) -> dict:
+    try:
+        async with _FETCH_SEMAPHORE:
+            transcript = await fetch_transcript_with_fallback(url)
+        async with _GENERATE_SEMAPHORE:
+            result = await generate_study_pack(transcript, flashcard_count, quiz_count, outputs=outputs)
+        return {"index": index, "url": url, "status": "done", "result": result}
+    except Exception as e:
+        return {"index": index, "url": url, "status": "error", "error": str(e)}
+
+
+async def run_batch(
+    urls: List[str], outputs: tuple, flashcard_count: int = 10, quiz_count: int = 5
+) -> AsyncIterator[dict]:
+    """Yield one result per video as soon as it finishes (not in input order)."""
+    # Batch calls queue behind interactive requests at the rate limiter.
+    with background_priority():
+        tasks = [
+            asyncio.create_task(_process(i, url, outputs, flashcard_count, quiz_count))
+            for i, url in enumerate(urls)
+        ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # A client that disconnects mid-batch stops the remaining work.
+        for task in tasks:
+            task.cancel()
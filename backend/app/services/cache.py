@@ -0,0 +1,173 @@
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from app.config import CACHE_MAX_BYTES, STORE_PATH
+from app.services.metrics import register_collector
+from app.services.store import SqliteStore, open_store
+
+
+def _sizeof(value: Any) -> int:
+    # Approximate retained size; good enough for budgeting strings and JSON-like outputs.
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_sizeof(item) for item in value)
+    return size
+
+
+class ByteBudgetCache:
+    """LRU cache bounded by approximate memory use rather than entry count.
+
+    Entries live in namespaces, each with its own TTL and hit/miss/eviction
+    counters, but all namespaces share one byte budget. With a ``store`` the
+    cache is read-through/write-through to it, so entries survive restarts
+    and are shared between worker processes.
+    """
+
+    def __init__(self, max_bytes: int, store: Optional[SqliteStore] = None):
+        self.max_bytes = max_bytes
+        self.store = store
+        self._lock = Lock()
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[Any, int, Optional[float]]]" = OrderedDict()
+        self._bytes = 0
+        self._namespaces: Dict[str, "CacheNamespace"] = {}
+
+    def namespace(self, name: str, ttl: Optional[float] = None) -> "CacheNamespace":
+        with self._lock:
+            ns = self._namespaces.get(name)
+            if ns is None:
+                ns = CacheNamespace(self, name, ttl)
+                self._namespaces[name] = ns
+            return ns
+
+    def _get(self, ns: "CacheNamespace", key: Hashable) -> Any:
+        full_key = (ns.name, key)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is None:
+                ns.misses += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._drop(full_key)
+                ns.expirations += 1
+                ns.misses += 1
+                return None
+            self._entries.move_to_end(full_key)
+            ns.hits += 1
+            return value
+
+    def _set(self, ns: "CacheNamespace", key: Hashable, value: Any, ttl: Optional[float]) -> None:
+        full_key = (ns.name, key)
+        size = _sizeof(key) + _sizeof(value)
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if full_key in self._entries:
+                self._drop(full_key)
+            if size > self.max_bytes:
+                return
+            self._entries[full_key] = (value, size, expires_at)
+            self._bytes += size
+            ns.entries += 1
+            ns.bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._namespaces[oldest[0]].evictions += 1
+
+    def _drop(self, full_key: Tuple[str, Hashable]) -> None:
+        _, size, _ = self._entries.pop(full_key)
+        self._bytes -= size
+        ns = self._namespaces[full_key[0]]
+        ns.entries -= 1
+        ns.bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_bytes": self.max_bytes,
+                "bytes": self._bytes,
+                "entries": len(self._entries),
+                "namespaces": {name: ns.stats() for name, ns in self._namespaces.items()},
+            }
+
+
+class CacheNamespace:
+    def __init__(self, cache: ByteBudgetCache, name: str, ttl: Optional[float]):
+        self.cache = cache
+        self.name = name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.entries = 0
+        self.bytes = 0
+        self.store_hits = 0
+
+    def get(self, key: Hashable) -> Any:
+        """Memory, then the store; blocks on SQLite, so async code uses ``get_async``."""
+        value = self.cache._get(self, key)
+        store = self.cache.store
+        if value is None and store is not None:
+            value = self._from_store(key, store.get(self.name, key))
+        return value
+
+    async def get_async(self, key: Hashable) -> Any:
+        value = self.cache._get(self, key)
+        store = self.cache.store
+        if value is None and store is not None:
+            value = self._from_store(key, await asyncio.to_thread(store.get, self.name, key))
+        return value
+
+    def _from_store(self, key: Hashable, value: Any) -> Any:
+        if value is not None:
+            self.store_hits += 1
+            self.cache._set(self, key, value, self.ttl)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = ttl if ttl is not None else self.ttl
+        self.cache._set(self, key, value, ttl)
+        if self.cache.store is not None:
+            self.cache.store.set(self.name, key, value, ttl)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": self.entries,
+            "bytes": self.bytes,
+            "store_hits": self.store_hits,
+        }
+
+
+CACHE = ByteBudgetCache(CACHE_MAX_BYTES, store=open_store(STORE_PATH))
+
+
+def cache_stats() -> dict:
+    return CACHE.stats()
+
+
+_COUNTERS = ("hits", "misses", "evictions", "expirations", "store_hits")
+
+
+def _samples():
+    stats = cache_stats()
+    yield "cache_bytes", "gauge", "Approximate bytes held by the in-memory cache.", {}, stats["bytes"]
+    yield "cache_max_bytes", "gauge", "In-memory cache byte budget.", {}, stats["max_bytes"]
+    for field in _COUNTERS:
+        for name, ns in stats["namespaces"].items():
+            yield f"cache_{field}_total", "counter", f"Cache {field.replace('_', ' ')} per namespace.", {"namespace": name}, ns[field]
+    for name, ns in stats["namespaces"].items():
+        yield "cache_entries", "gauge", "Entries per cache namespace.", {"namespace": name}, ns["entries"]
+
+
+register_collector(_samples)
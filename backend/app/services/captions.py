@@ -0,0 +1,154 @@
+import re
+from typing import Iterable, Iterator, List, Tuple, Union
+
+# (start seconds, end seconds, text)
+Segment = Tuple[float, float, str]
+
+_TIMING_RE = re.compile(
+    r"(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{1,3})\s*-->\s*(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{1,3})"
+)
+_TAG_RE = re.compile(r"<[^>]*>|\{\\[^}]*\}")
+_SKIP_BLOCKS = ("WEBVTT", "NOTE", "STYLE", "REGION")
+
+# Rolling auto-captions start each cue where the previous one ended; a cue
+# starting within this many seconds of the previous end continues it.
+_TOUCH_SECONDS = 0.05
+# Longest single-line cue still treated as a hold cue (YouTube's last 10 ms).
+_HOLD_SECONDS = 0.05
+
+
+def _seconds(hours, minutes, seconds, millis) -> float:
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(millis.ljust(3, "0")) / 1000
+
+
+def _is_timing(line: str) -> bool:
+    # Cheap shape check for the canonical "HH:MM:SS.mmm --> HH:MM:SS.mmm" line.
+    if len(line) >= 29 and line[13:16] == "-->" and line[2] == ":" and line[19] == ":":
+        return True
+    return _TIMING_RE.search(line) is not None
+
+
+def _parse_timing(line: str) -> Tuple[float, float]:
+    # Parsed lazily, only for segments a caller actually receives.
+    if len(line) >= 29 and line[13:16] == "-->" and line[2] == ":" and line[19] == ":":
+        try:
+            return (
+                int(line[0:2]) * 3600 + int(line[3:5]) * 60 + float(line[6:12].replace(",", ".")),
+                int(line[17:19]) * 3600 + int(line[20:22]) * 60 + float(line[23:29].replace(",", ".")),
+            )
+        except ValueError:
+            pass
+    match = _TIMING_RE.search(line)
+    if not match:
+        return 0.0, 0.0
+    groups = match.groups()
+    return _seconds(*groups[:4]), _seconds(*groups[4:])
+
+
+def _clean(line: str) -> str:
+    # VTT tags are inline markup (<c>, <i>, <v Speaker>, karaoke timestamps),
+    # so they are removed without inserting whitespace.
+    if "<" in line or "{" in line:
+        line = _TAG_RE.sub("", line)
+    if "  " in line or "\t" in line:
+        line = " ".join(line.split())
+    return line
+
+
+def _iter_cue_lines(lines: Iterable[Union[str, bytes]]) -> Iterator[Tuple[str, List[str]]]:
+    timing = ""
+    payload: List[str] = []
+    in_cue = False
+    skipping = False
+
+    for raw in lines:
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8", errors="ignore")
+        raw = raw.rstrip("\r\n")
+
+        if not raw:
+            # A truly empty line ends the current block.
+            if payload:
+                yield timing, payload
+            payload = []
+            in_cue = False
+            skipping = False
+            continue
+
+        line = raw.strip().lstrip("\ufeff")
+        if not line or skipping:
+            continue
+
+        if "-->" in line and _is_timing(line):
+            # Also starts a new cue when the blank separator line was lost.
+            if payload:
+                yield timing, payload
+                payload = []
+            timing = line
+            in_cue = True
+            continue
+
+        if in_cue:
+            text = _clean(line)
+            if text:
+                payload.append(text)
+        elif line.startswith(_SKIP_BLOCKS):
+            skipping = True
+        # Anything else before a timing line is a cue identifier (SRT index).
+
+    if payload:
+        yield timing, payload
+
+
+def iter_cues(lines: Iterable[Union[str, bytes]]) -> Iterator[Segment]:
+    """Single pass over WebVTT or SRT lines (str or bytes), one cleaned cue at a time."""
+    for timing, payload in _iter_cue_lines(lines):
+        yield (*_parse_timing(timing), " ".join(payload))
+
+
+def _iter_fresh(lines: Iterable[Union[str, bytes]]) -> Iterator[Tuple[str, str]]:
+    prev_last = ""
+    prev_timing = ""
+    prev_rolling = False
+    for timing, payload in _iter_cue_lines(lines):
+        rolling = len(payload) > 1
+        # Only a line carried over from the cue just before is a repeat; the
+        # same words anywhere else are real speech. A rolling cue starts where
+        # the previous one ended (YouTube writes that time verbatim) and adds
+        # a line below the carried one; a hold cue then shows only that line,
+        # for a blink. Touching manual cues that repeat a line are neither.
+        # Timings are looked at only once the text matches.
+        if (
+            payload[0] == prev_last
+            and (prev_timing[17:29] == timing[:12] or _touches(prev_timing, timing))
+            and (rolling or prev_rolling or _is_hold(timing))
+        ):
+            if rolling:
+                yield timing, " ".join(payload[1:])
+        else:
+            yield timing, " ".join(payload)
+        prev_last, prev_timing, prev_rolling = payload[-1], timing, rolling
+
+
+def _touches(prev_timing: str, timing: str) -> bool:
+    return _parse_timing(timing)[0] <= _parse_timing(prev_timing)[1] + _TOUCH_SECONDS
+
+
+def _is_hold(timing: str) -> bool:
+    start, end = _parse_timing(timing)
+    return end - start <= _HOLD_SECONDS
+
+
+def iter_segments(lines: Iterable[Union[str, bytes]]) -> Iterator[Segment]:
+    """Like ``iter_cues`` but each segment carries only text not already shown.
+
+    YouTube auto-captions roll: every cue repeats the previous line above the
+    new one, and short "hold" cues repeat it again, which would otherwise
+    double or triple the transcript.
+    """
+    for timing, text in _iter_fresh(lines):
+        yield (*_parse_timing(timing), text)
+
+
+def captions_to_text(lines: Iterable[Union[str, bytes]]) -> str:
+    return " ".join(text for _, text in _iter_fresh(lines))
@@ -0,0 +1,85 @@
+import re
+import zlib
+from functools import lru_cache
+from typing import List, Sequence
+
+# MinHash over a question's content words. Quiz questions share templates
+# ("What is the role of DNA?" / "...of RNA?"), so the question frame and
+# stopwords are dropped and only the words that say what is asked remain.
+_NUM_PERM = 64
+_PRIME = (1 << 31) - 1
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_TEMPLATE_WORDS = frozenset(
+    "what which who whom whose when where why how is are was were be been being does do did "
+    "the a an of to in on at by for from with as and or its it this that these those there "
+    "following best describes describe described explain define definition meaning mean means "
+    "term statement true correct about can could would should will main primary name give "
+    "example examples one type kind".split()
+)
+
+# Estimated Jaccard similarity at which two items count as the same question.
+NEAR_DUPLICATE_THRESHOLD = 0.6
+
+
+@lru_cache(maxsize=None)
+def _permutations():
+    import numpy as np
+
+    rng = np.random.default_rng(0x5EED)
+    return (
+        rng.integers(1, _PRIME, _NUM_PERM, dtype=np.uint64),
+        rng.integers(0, _PRIME, _NUM_PERM, dtype=np.uint64),
+    )
+
+
+def _stem(word: str) -> str:
+    # Plurals only: "cells" and "cell" ask the same thing.
+    if len(word) > 4 and word.endswith("s") and not word.endswith(("ss", "is", "us")):
+        return word[:-1]
+    return word
+
+
+def _content_words(text: str) -> frozenset:
+    words = _WORD_RE.findall(text.lower())
+    content = [_stem(w) for w in words if w not in _TEMPLATE_WORDS]
+    # A question made only of frame words is compared on all of them.
+    return frozenset(content or words or [""])
+
+
+def _signature(text: str):
+    import numpy as np
+
+    a, b = _permutations()
+    grams = _content_words(text)
+    hashes = np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+    hashes %= _PRIME
+    # (a*h + b) mod p stays below 2**63, so uint64 never overflows.
+    return ((hashes[:, None] * a + b) % _PRIME).min(axis=0)
+
+
+def signatures(texts: Sequence[str]):
+    import numpy as np
+
+    if not texts:
+        return np.empty((0, _NUM_PERM), dtype=np.uint64)
+    return np.stack([_signature(text) for text in texts])
+
+
+def unique_mask(
+    texts: Sequence[str], existing: Sequence[str] = (), threshold: float = NEAR_DUPLICATE_THRESHOLD
+) -> List[bool]:
+    """Which of ``texts`` are not near-duplicates of ``existing`` or of an earlier kept text."""
+    if not texts:
+        return []
+    sig = signatures(list(existing) + list(texts))
+    # Pairwise share of equal MinHash slots estimates Jaccard similarity.
+    similar = (sig[:, None, :] == sig[None, :, :]).mean(axis=2) >= threshold
+    kept = list(range(len(existing)))
+    mask: List[bool] = []
+    for i in range(len(existing), len(sig)):
+        keep = not similar[i, kept].any()
+        mask.append(bool(keep))
+        if keep:
+            kept.append(i)
+    return mask
@@ -0,0 +1,99 @@
+import re
+from typing import List, Tuple
+
+from app.services.segments import SegmentedTranscript
+from app.services.tokens import estimate_tokens
+
+_WORD_RE = re.compile(r"[a-z][a-z0-9']+")
+_STOPWORDS = frozenset(
+    "the and for that this with you are was were have has had not but its it's they them their "
+    "what when where which who will would can could should about there here then than from into "
+    "your our just like so very really also some any all one two get got going gonna okay yeah "
+    "know think right now well let's i'm we're don't be is of to in on at as by an or if do".split()
+)
+
+# Caption cues are sentence fragments; units are grown to at least this size.
+_MIN_UNIT_CHARS = 200
+# Equal slices of the transcript that each get a share of the budget, so
+# every part of a long lecture is represented.
+_SECTIONS = 10
+
+
+def _units(transcript: SegmentedTranscript) -> List[Tuple[int, int]]:
+    units: List[Tuple[int, int]] = []
+    offsets = transcript.offsets
+    first = 0
+    for i in range(len(offsets)):
+        end = offsets[i + 1] if i + 1 < len(offsets) else len(transcript.text)
+        if end - offsets[first] >= _MIN_UNIT_CHARS:
+            units.append((first, i))
+            first = i + 1
+    if first < len(offsets):
+        units.append((first, len(offsets) - 1))
+    return units
+
+
+def _scores(texts: List[str]):
+    """TF-IDF cosine similarity of each unit to the whole transcript's centroid."""
+    import numpy as np
+
+    vocab: dict = {}
+    term_ids: List[int] = []
+    unit_ids: List[int] = []
+    for u, text in enumerate(texts):
+        ids = [vocab.setdefault(w, len(vocab)) for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS]
+        term_ids.extend(ids)
+        unit_ids.extend([u] * len(ids))
+
+    n, size = len(texts), max(1, len(vocab))
+    if not term_ids:
+        return np.zeros(n)
+    keys, counts = np.unique(np.array(unit_ids, dtype=np.int64) * size + np.array(term_ids), return_counts=True)
+    units, terms = keys // size, keys % size
+
+    df = np.bincount(terms, minlength=size)
+    idf = np.log((n + 1) / (df + 1)) + 1.0
+    weights = (1.0 + np.log(counts)) * idf[terms]
+    norms = np.sqrt(np.bincount(units, weights=weights * weights, minlength=n))
+    weights = weights / norms[units]
+
+    centroid = np.bincount(terms, weights=weights, minlength=size)
+    centroid /= np.linalg.norm(centroid) or 1.0
+    return np.bincount(units, weights=weights * centroid[terms], minlength=n)
+
+
+def extract_key_passages(transcript: SegmentedTranscript, max_tokens: int) -> str:
+    """The most representative passages that fit ``max_tokens``, in transcript order.
+
+    Each of ``_SECTIONS`` equal slices of the transcript gets a share of the
+    budget by its size and is filled with its highest-scoring passages; any
+    budget left over goes to the best remaining passages overall.
+    """
+    import numpy as np
+
+    units = _units(transcript)
+    if not units:
+        return ""
+    texts = [transcript.render_range(first, last) for first, last in units]
+    costs = np.array([estimate_tokens(text) + 1 for text in texts])
+    if costs.sum() <= max_tokens:
+        return "\n".join(texts)
+
+    scores = _scores(texts)
+    chosen = np.zeros(len(units), dtype=bool)
+    used = 0
+    for section in np.array_split(np.arange(len(units)), min(_SECTIONS, len(units))):
+        quota = max_tokens * costs[section].sum() / costs.sum()
+        spent = 0
+        for i in section[np.argsort(-scores[section], kind="stable")]:
+            if spent + costs[i] <= quota:
+                chosen[i] = True
+                spent += costs[i]
+        used += spent
+
+    for i in np.argsort(-scores, kind="stable"):
+        if not chosen[i] and used + costs[i] <= max_tokens:
+            chosen[i] = True
+            used += costs[i]
+
+    return "\n".join(texts[i] for i in np.flatnonzero(chosen))
@@ -0,0 +1,177 @@
+import hashlib
+import time
+from typing import List, Optional
+
+from app.config import (
+    GROQ_MAX_CONNECTIONS,
+    GROQ_TIMEOUT_SECONDS,
+    RATE_LIMIT_SHARED,
+    STORE_PATH,
+    groq_pool_specs,
+)
+from app.services.metrics import register_collector
+from app.services.rate_limit import create_limiter
+
+# Weight of the newest call in each member's smoothed latency.
+_LATENCY_ALPHA = 0.2
+# Assumed latency of a member that has not answered yet.
+_INITIAL_LATENCY_SECONDS = 1.0
+# A member that errors sits out this long, doubling per consecutive failure.
+_COOLDOWN_SECONDS = 5.0
+_MAX_COOLDOWN_SECONDS = 120.0
+
+# One pooled HTTP client shared by every member on this worker, built on first use.
+_http_client = None
+
+
+def _shared_http_client():
+    global _http_client
+    if _http_client is None:
+        import httpx
+
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=GROQ_MAX_CONNECTIONS,
+                max_keepalive_connections=GROQ_MAX_CONNECTIONS,
+            ),
+            timeout=httpx.Timeout(GROQ_TIMEOUT_SECONDS, connect=10.0),
+        )
+    return _http_client
+
+
+class PoolMember:
+    """One API key and model, with its own quota, client and health."""
+
+    def __init__(self, api_key: str, model: str, rpm: int, tpm: int):
+        self.api_key = api_key
+        self.model = model
+        # Stable across workers (shared quota rows) without exposing the key.
+        self.name = f"{model}:{hashlib.sha1(api_key.encode()).hexdigest()[:8]}"
+        self.limiter = create_limiter(
+            rpm, tpm, shared_path=STORE_PATH if RATE_LIMIT_SHARED else None, name=f"groq:{self.name}"
+        )
+        # Built on first use; benchmarks may assign a stand-in.
+        self.client = None
+        self.latency = _INITIAL_LATENCY_SECONDS
+        self.in_flight = 0
+        self.failures = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def get_client(self):
+        if self.client is None:
+            from groq import AsyncGroq
+
+            self.client = AsyncGroq(api_key=self.api_key, http_client=_shared_http_client())
+        return self.client
+
+    def cost(self, tokens: int) -> float:
+        # Expected seconds until an answer: the quota wait, plus the smoothed
+        # latency for this call and each one already running or queued here.
+        return self.limiter.estimate_wait(tokens) + self.latency * (1 + self.in_flight + self.limiter.queued)
+
+    def succeeded(self, seconds: Optional[float]) -> None:
+        self.requests += 1
+        self.failures = 0
+        if seconds is not None:
+            self.latency += _LATENCY_ALPHA * (seconds - self.latency)
+
+    def failed(self, cooldown: Optional[float] = None) -> None:
+        self.requests += 1
+        self.errors += 1
+        self.failures += 1
+        if cooldown is None:
+            cooldown = min(_MAX_COOLDOWN_SECONDS, _COOLDOWN_SECONDS * 2 ** (self.failures - 1))
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + cooldown)
+
+
+class GroqPool:
+    """Routes each LLM call to the pool member expected to answer soonest.
+
+    Members serving the requested model compete on quota wait and observed
+    latency; members of other models only take over while every member of
+    the requested one is cooling down after errors.
+    """
+
+    def __init__(self, specs: List[dict]):
+        self.members = [PoolMember(**spec) for spec in specs]
+
+    def models(self) -> List[str]:
+        return list(dict.fromkeys(member.model for member in self.members))
+
+    def pick(self, model: str, tokens: int) -> PoolMember:
+        if not self.members:
+            raise RuntimeError("No Groq API key configured")
+        now = time.monotonic()
+        ready = [m for m in self.members if m.cooldown_until <= now]
+        preferred = [m for m in ready if m.model == model] or ready
+        if not preferred:
+            # Everyone is cooling down: take whoever comes back first.
+            return min(self.members, key=lambda m: m.cooldown_until)
+        return min(preferred, key=lambda m: m.cost(tokens))
+
+    def has_alternative(self, member: PoolMember) -> bool:
+        now = time.monotonic()
+        return any(m is not member and m.cooldown_until <= now for m in self.members)
+
+    async def close(self) -> None:
+        global _http_client
+        for member in self.members:
+            if member.client is not None:
+                await member.client.close()
+                member.client = None
+        if _http_client is not None:
+            await _http_client.aclose()
+            _http_client = None
+
+    def stats(self) -> List[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "member": m.name,
+                "model": m.model,
+                "requests": m.requests,
+                "errors": m.errors,
+                "in_flight": m.in_flight,
+                "latency_seconds": round(m.latency, 3),
+                "cooling_down": m.cooldown_until > now,
+                **m.limiter.stats(),
+            }
+            for m in self.members
+        ]
+
+
+def _pool_specs() -> List[dict]:
+    try:
+        return groq_pool_specs()
+    except (ValueError, KeyError, TypeError):
+        # validate_config reports this at startup; importing must not fail.
+        return []
+
+
+POOL = GroqPool(_pool_specs())
+
+
+# (metric, type, help, stats field); each metric lists every member together.
+_SERIES = (
+    ("groq_pool_requests_total", "counter", "LLM calls per pool member.", "requests"),
+    ("groq_pool_errors_total", "counter", "Failed LLM calls per pool member.", "errors"),
+    ("groq_pool_in_flight", "gauge", "LLM calls running per pool member.", "in_flight"),
+    ("groq_pool_latency_seconds", "gauge", "Smoothed LLM call latency per pool member.", "latency_seconds"),
+    ("groq_pool_cooling_down", "gauge", "1 while a pool member sits out after errors.", "cooling_down"),
+    ("rate_limit_queued", "gauge", "LLM calls waiting for rate-limit capacity.", "queued"),
+    ("rate_limit_waits_total", "counter", "LLM calls that had to wait for capacity.", "waits"),
+    ("rate_limit_wait_seconds_total", "counter", "Time spent waiting for capacity.", "wait_seconds"),
+)
+
+
+def _samples():
+    members = POOL.stats()
+    for name, kind, help_text, field in _SERIES:
+        for member in members:
+            labels = {"member": member["member"], "model": member["model"]}
+            yield name, kind, help_text, labels, float(member[field])
+
+
+register_collector(_samples)
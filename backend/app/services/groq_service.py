@@ -1,26 +1,75 @@
-from groq import Groq
-from app.config import GROQ_API_KEY
+from app.config import (
+    ARTIFACT_CACHE_TTL_SECONDS,
+    EXTRACTIVE_SUMMARY_RATIO,
+    GROQ_GENERATION_MODEL,
+    GROQ_SUMMARY_MODEL,
+    SUMMARY_CONCURRENCY,
+)
+import asyncio
+import contextlib
+import contextvars
 import json
-import time
 import hashlib
+import random
 import re
-from typing import Any, List, Optional
-from threading import Lock
-
-client = Groq(api_key=GROQ_API_KEY)
-
-MODEL = "llama-3.1-8b-instant"
-
-# Keep prompts comfortably under Groq limits.
-# (Chars are a crude but reliable proxy for tokens across languages.)
-_MAX_TRANSCRIPT_CHARS = 15000
-_MAX_SUMMARY_CHARS = 9000
-
-_SUMMARY_CACHE = {}
-_SUMMARY_LOCKS = {}
-_NOTES_CACHE = {}
-_FLASHCARDS_CACHE = {}
-_QUIZ_CACHE = {}
+import time
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional, Tuple, Union
+from app.services.cache import CACHE
+from app.services.dedupe import unique_mask
+from app.services.extractive import extract_key_passages
+from app.services.groq_pool import POOL, PoolMember
+from app.services.metrics import inc, register_collector, span
+from app.services.segments import Chunk, SegmentedTranscript
+from app.services.singleflight import SingleFlight
+from app.services.tokens import estimate_tokens, prompt_budget, split_by_tokens, truncate_to_tokens
+
+# Bounds chunk calls in flight across concurrent requests (TPM budget).
+_SUMMARY_SEMAPHORE = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+
+# Prompt budgets are derived from the model's token limits (see _transcript_budget);
+# this much of each request is left for the model's reply, and replies are capped at it.
+_COMPLETION_RESERVE_TOKENS = 1500
+
+_SUMMARY_CACHE = CACHE.namespace("summary", ttl=ARTIFACT_CACHE_TTL_SECONDS)
+# Keyed by chunk content (which carries its [mm:ss] range), so re-chunking reuses them.
+_CHUNK_SUMMARY_CACHE = CACHE.namespace("chunk_summary", ttl=ARTIFACT_CACHE_TTL_SECONDS)
+_NOTES_CACHE = CACHE.namespace("notes", ttl=ARTIFACT_CACHE_TTL_SECONDS)
+# One growing pool of validated items per transcript; each request takes a
+# slice (or a random sample) and only a shortfall goes to the LLM.
+_FLASHCARDS_CACHE = CACHE.namespace("flashcards", ttl=ARTIFACT_CACHE_TTL_SECONDS)
+_QUIZ_CACHE = CACHE.namespace("quiz", ttl=ARTIFACT_CACHE_TTL_SECONDS)
+
+# Concurrent requests for the same transcript share one in-flight LLM pipeline.
+_SUMMARY_FLIGHT = SingleFlight("summary")
+_NOTES_FLIGHT = SingleFlight("notes")
+_FLASHCARDS_FLIGHT = SingleFlight("flashcards")
+_QUIZ_FLIGHT = SingleFlight("quiz")
+
+
+async def close_client() -> None:
+    await POOL.close()
+
+
+def _warm_local() -> None:
+    # Imports numpy and compiles the regexes and prompt budgets the first request would.
+    _transcript_budget()
+    _chunk_budget()
+    sample = SegmentedTranscript.from_text("Cells store energy. Enzymes speed up reactions. " * 40)
+    extract_key_passages(sample, 50)
+    unique_mask(["What is a cell?", "What is an enzyme?"])
+
+
+async def warmup() -> None:
+    """Pay one-off startup costs before the first request instead of during it."""
+    await asyncio.to_thread(_warm_local)
+    if not POOL.members:
+        return
+    try:
+        # Opens the pooled TLS connection to Groq; costs no tokens.
+        await POOL.members[0].get_client().models.list()
+    except Exception:
+        pass
 
 
 def _strip_code_fences(text: str) -> str:
@@ -70,16 +119,96 @@ def _loads_json_lenient(text: str) -> Any:
     return json.loads(candidate)
 
 
-def _ask_groq_json(prompt: str, schema_hint: str) -> Any:
+# How often JSON answers parse first time, are salvaged locally, or need a
+# repair round trip to the model.
+_JSON_STATS = {"requests": 0, "parsed": 0, "salvaged": 0, "repairs": 0, "failures": 0}
+
+
+def json_stats() -> dict:
+    return dict(_JSON_STATS)
+
+
+def _samples():
+    for outcome, value in json_stats().items():
+        yield "llm_json_total", "counter", "Structured-output requests by outcome.", {"outcome": outcome}, value
+
+
+register_collector(_samples)
+
+
+def _unwrap_items(data: Any) -> Any:
+    # JSON mode only allows a top-level object, so arrays arrive as {"items": [...]}.
+    if isinstance(data, dict):
+        if isinstance(data.get("items"), list):
+            return data["items"]
+        lists = [value for value in data.values() if isinstance(value, list)]
+        if len(lists) == 1:
+            return lists[0]
+    return data
+
+
+def _salvage_items(text: str) -> List[Any]:
+    """Complete elements of the first JSON array in ``text``, even if it is cut off."""
+    text = _strip_code_fences(text)
+    start = text.find("[")
+    if start == -1:
+        return []
+    decoder = json.JSONDecoder()
+    items: List[Any] = []
+    pos = start + 1
+    while True:
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(text) or text[pos] == "]":
+            break
+        try:
+            item, pos = decoder.raw_decode(text, pos)
+        except ValueError:
+            break  # truncated or malformed element: keep what decoded so far
+        items.append(item)
+    return items
+
+
+def _failed_generation(e: Exception) -> Optional[str]:
+    # Groq rejects JSON-mode output that does not validate, but returns it.
+    body = getattr(e, "body", None)
+    if isinstance(body, dict):
+        error = body.get("error", body)
+        if isinstance(error, dict) and isinstance(error.get("failed_generation"), str):
+            return error["failed_generation"]
+    return None
+
+
+async def _ask_groq_json_mode(prompt: str) -> str:
+    try:
+        return await _ask_groq(prompt, json_mode=True)
+    except Exception as e:
+        raw = _failed_generation(e)
+        if raw is None:
+            raise
+        return raw
+
+
+async def _ask_groq_json(prompt: str, schema_hint: str) -> Any:
+    _JSON_STATS["requests"] += 1
     last_err: Exception | None = None
-    raw = ""
+    raw = await _ask_groq_json_mode(prompt)
     for attempt in range(3):
         try:
-            raw = _ask_groq(prompt)
-            return _loads_json_lenient(raw)
-        except Exception as e:
+            data = _unwrap_items(_loads_json_lenient(raw))
+            _JSON_STATS["parsed"] += 1
+            return data
+        except ValueError as e:
             last_err = e
-            repair_prompt = f"""Return ONLY valid JSON matching this schema:
+            items = _salvage_items(raw)
+            if items:
+                _JSON_STATS["salvaged"] += 1
+                return items
+
+        if attempt == 2:
+            break
+        _JSON_STATS["repairs"] += 1
+        repair_prompt = f"""Return ONLY valid JSON matching this schema:
 {schema_hint}
 
 Rules:
@@ -89,50 +218,201 @@ Rules:
 Fix this output into valid JSON:
 {raw}
 """
-            prompt = repair_prompt
+        with span(stage="json_repair"):
+            raw = await _ask_groq_json_mode(repair_prompt)
 
+    _JSON_STATS["failures"] += 1
     raise RuntimeError(f"Failed to produce valid JSON: {last_err}")
 
 
-def _sample_text(text: str, max_chars: int) -> str:
-    text = (text or "").strip()
-    if len(text) <= max_chars:
-        return text
+async def _ask_groq(prompt: str, json_mode: bool = False, model: str = GROQ_GENERATION_MODEL) -> str:
+    last_err: Exception | None = None
+    reserved = estimate_tokens(prompt) + _COMPLETION_RESERVE_TOKENS
+    # JSON mode makes the API return a single valid JSON object.
+    extra = {"response_format": {"type": "json_object"}} if json_mode else {}
+    kind = "json" if json_mode else "text"
+    for attempt in range(4):
+        member = await _acquire_member(model, reserved)
+        started = time.perf_counter()
+        member.in_flight += 1
+        try:
+            with span("llm_request_seconds", kind=kind):
+                raw = await member.get_client().chat.completions.with_raw_response.create(
+                    model=member.model,
+                    messages=_messages(prompt),
+                    temperature=0.3,
+                    max_completion_tokens=_COMPLETION_RESERVE_TOKENS,
+                    **extra,
+                )
+        except Exception as e:
+            last_err = e
+            if await _fail_over(member, e, attempt):
+                inc("llm_requests_total", kind=kind, outcome="retry")
+                continue
+            inc("llm_requests_total", kind=kind, outcome="error")
+            raise
+        finally:
+            member.in_flight -= 1
+
+        member.succeeded(time.perf_counter() - started)
+        inc("llm_requests_total", kind=kind, outcome="ok")
+        response = raw.parse()
+        usage = getattr(response, "usage", None)
+        _record_usage(usage)
+        await member.limiter.complete(reserved, getattr(usage, "total_tokens", None), raw.headers)
+        choice = response.choices[0]
+        if getattr(choice, "finish_reason", None) == "length":
+            _mark_truncated(kind)
+        return choice.message.content.strip()
 
-    # Take slices from start/middle/end to represent the whole video.
-    piece = max_chars // 3
-    start = text[:piece]
-    mid_start = max(0, (len(text) // 2) - (piece // 2))
-    middle = text[mid_start : mid_start + piece]
-    end = text[-piece:]
-    return (start + "\n...\n" + middle + "\n...\n" + end).strip()
+    raise last_err  # type: ignore[misc]
 
 
-def _ask_groq(prompt: str) -> str:
+async def _ask_groq_stream(
+    prompt: str, model: str = GROQ_GENERATION_MODEL, cut: Optional[List[bool]] = None
+) -> AsyncIterator[str]:
+    # Retries only cover opening the stream; once tokens flow they are the client's.
     last_err: Exception | None = None
+    prompt_tokens = estimate_tokens(prompt)
+    reserved = prompt_tokens + _COMPLETION_RESERVE_TOKENS
     for attempt in range(4):
+        member = await _acquire_member(model, reserved)
+        member.in_flight += 1
         try:
-            response = client.chat.completions.create(
-                model=MODEL,
-                messages=[
-                    {"role": "system", "content": "You help students study."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3
-            )
-            return response.choices[0].message.content.strip()
+            with span("llm_request_seconds", kind="stream"):
+                raw = await member.get_client().chat.completions.with_raw_response.create(
+                    model=member.model,
+                    messages=_messages(prompt),
+                    temperature=0.3,
+                    max_completion_tokens=_COMPLETION_RESERVE_TOKENS,
+                    stream=True,
+                )
+            inc("llm_requests_total", kind="stream", outcome="ok")
+            break
         except Exception as e:
             last_err = e
-            msg = str(e).lower()
-            if "rate_limit" in msg or "tpm" in msg or "413" in msg or "429" in msg:
-                time.sleep(1.5 * (attempt + 1))
+            if await _fail_over(member, e, attempt):
+                inc("llm_requests_total", kind="stream", outcome="retry")
                 continue
+            inc("llm_requests_total", kind="stream", outcome="error")
             raise
-
-    raise last_err  # type: ignore[misc]
+        finally:
+            member.in_flight -= 1
+    else:
+        raise last_err  # type: ignore[misc]
+
+    # Time to first byte says little about a full reply, so latency is not sampled.
+    member.succeeded(None)
+    await member.limiter.observe_headers(raw.headers)
+    stream = raw.parse()
+    completion_tokens = 0
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        if getattr(chunk.choices[0], "finish_reason", None) == "length":
+            # An async generator runs in its consumer's context, so the caller passes ``cut``.
+            _mark_truncated("stream")
+            if cut is not None:
+                cut.append(True)
+        delta = chunk.choices[0].delta.content
+        if delta:
+            completion_tokens += estimate_tokens(delta)
+            yield delta
+    # Streamed replies carry no usage, so these counts are estimates.
+    inc("llm_tokens_total", prompt_tokens, type="prompt")
+    inc("llm_tokens_total", completion_tokens, type="completion")
+    await member.limiter.settle(reserved, prompt_tokens + completion_tokens)
+
+
+async def _acquire_member(model: str, reserved: int) -> PoolMember:
+    # Every Groq call reserves its estimated tokens on the chosen member's quota.
+    member = POOL.pick(model, reserved)
+    delay = member.cooldown_until - time.monotonic()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    await member.limiter.acquire(reserved)
+    return member
+
+
+# Replies stop at _COMPLETION_RESERVE_TOKENS. Builders of cacheable results
+# watch for replies cut off there and return such results without caching them.
+_TRUNCATED: contextvars.ContextVar[Tuple[List[bool], ...]] = contextvars.ContextVar(
+    "llm_truncated", default=()
+)
+
+
+@contextlib.contextmanager
+def _watch_truncation() -> Iterator[List[bool]]:
+    """Collects truncated replies from this block and tasks started in it (nested blocks too)."""
+    cut: List[bool] = []
+    token = _TRUNCATED.set(_TRUNCATED.get() + (cut,))
+    try:
+        yield cut
+    finally:
+        _TRUNCATED.reset(token)
+
+
+def _mark_truncated(kind: str) -> None:
+    inc("llm_truncated_total", help="LLM replies cut off at the completion token cap.", kind=kind)
+    for cut in _TRUNCATED.get():
+        cut.append(True)
+
+
+def _record_usage(usage: Any) -> None:
+    if usage is None:
+        return
+    inc("llm_tokens_total", getattr(usage, "prompt_tokens", 0) or 0, type="prompt")
+    inc("llm_tokens_total", getattr(usage, "completion_tokens", 0) or 0, type="completion")
+
+
+def _messages(prompt: str) -> List[dict]:
+    return [
+        {"role": "system", "content": "You help students study."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _is_too_large(e: Exception) -> bool:
+    # 413 is about the prompt, not the member: resending it anywhere fails the same way.
+    msg = str(e).lower()
+    return getattr(e, "status_code", None) == 413 or "413" in msg or "request too large" in msg
+
+
+def _is_retryable(e: Exception) -> bool:
+    if _is_too_large(e):
+        return False
+    msg = str(e).lower()
+    return getattr(e, "status_code", None) == 429 or "rate_limit" in msg or "429" in msg
+
+
+def _is_unavailable(e: Exception) -> bool:
+    # Timeouts, dropped connections and 5xx: the member is unhealthy, not the request.
+    status = getattr(e, "status_code", None)
+    return (isinstance(status, int) and status >= 500) or type(e).__name__ in (
+        "APIConnectionError",
+        "APITimeoutError",
+    )
+
+
+async def _fail_over(member: PoolMember, e: Exception, attempt: int) -> bool:
+    """Record a failed call on ``member``; whether the call should be retried."""
+    if _is_retryable(e):
+        # Let the limiter pace the retry when the server said how long to wait.
+        headers = getattr(getattr(e, "response", None), "headers", None)
+        if headers and headers.get("retry-after"):
+            await member.limiter.observe_headers(headers)
+            member.failed(cooldown=0.0)
+        else:
+            member.failed(1.5 * (attempt + 1))
+        return True
+    if _is_unavailable(e):
+        member.failed()
+        # The SDK already retried this member; only another one can help.
+        return POOL.has_alternative(member)
+    return False
 
 
-def _chunk_text(text: str, max_chars: int) -> List[str]:
+def _chunk_text(text: str, max_tokens: int) -> List[str]:
     text = (text or "").strip()
     if not text:
         return []
@@ -141,120 +421,314 @@ def _chunk_text(text: str, max_chars: int) -> List[str]:
     parts = [p.strip() for p in re.split(r"(?<=[.!?])\s+", text) if p.strip()]
     chunks: List[str] = []
     buf: List[str] = []
-    buf_len = 0
+    buf_tokens = 0
 
     def flush():
-        nonlocal buf, buf_len
+        nonlocal buf, buf_tokens
         if buf:
             chunks.append("\n".join(buf).strip())
             buf = []
-            buf_len = 0
+            buf_tokens = 0
 
     for part in parts:
-        if len(part) > max_chars:
+        part_tokens = estimate_tokens(part) + 1
+        if part_tokens > max_tokens:
             flush()
-            for i in range(0, len(part), max_chars):
-                chunks.append(part[i : i + max_chars])
+            chunks.extend(split_by_tokens(part, max_tokens))
             continue
 
-        if buf_len + len(part) + 1 > max_chars:
+        if buf_tokens + part_tokens > max_tokens:
             flush()
 
         buf.append(part)
-        buf_len += len(part) + 1
+        buf_tokens += part_tokens
 
     flush()
     return [c for c in chunks if c]
 
 
-def _summarize_transcript(transcript: str) -> str:
-    transcript = (transcript or "").strip()
-    if len(transcript) <= _MAX_TRANSCRIPT_CHARS:
+def _prompt_budget(overhead: int) -> int:
+    # Any member may take over a call, so budgets fit the smallest model in the pool.
+    models = POOL.models() or [GROQ_GENERATION_MODEL]
+    return min(prompt_budget(model, overhead, _COMPLETION_RESERVE_TOKENS) for model in models)
+
+
+@lru_cache(maxsize=None)
+def _transcript_budget() -> int:
+    # Largest transcript any generation prompt can take directly.
+    overhead = max(
+        estimate_tokens(_notes_prompt("")),
+        estimate_tokens(_flashcards_prompt("", 20, ["?"])) + _AVOID_TOKENS,
+        estimate_tokens(_quiz_prompt("", 10, ["?"])) + _AVOID_TOKENS,
+    )
+    return _prompt_budget(overhead)
+
+
+@lru_cache(maxsize=None)
+def _chunk_budget() -> int:
+    overhead = max(estimate_tokens(_chunk_prompt(999, 999, "")), estimate_tokens(_compress_prompt("")))
+    return _prompt_budget(overhead)
+
+
+def _summary_budget() -> int:
+    # Condensed outlines stay well inside the direct budget so generation has headroom.
+    return int(_transcript_budget() * 0.6)
+
+
+# Generators accept raw text or a timed transcript from transcript_service.
+TranscriptInput = Union[str, SegmentedTranscript]
+
+
+def _as_segments(transcript: TranscriptInput) -> SegmentedTranscript:
+    if isinstance(transcript, SegmentedTranscript):
         return transcript
+    return SegmentedTranscript.from_text(transcript or "")
+
+
+def _text_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8", errors="ignore")).hexdigest()
 
-    key = hashlib.sha1(transcript.encode("utf-8", errors="ignore")).hexdigest()
-    cached = _SUMMARY_CACHE.get(key)
+
+def transcript_key(transcript: TranscriptInput) -> str:
+    """Content hash of a transcript; every cached artifact of it is keyed by this."""
+    return _text_key(_as_segments(transcript).text)
+
+
+# Called as (stage, done, total) while a long transcript is being condensed.
+ProgressCallback = Callable[[str, int, int], None]
+
+
+def _is_long(transcript: SegmentedTranscript) -> bool:
+    return transcript.rendered_tokens() > _transcript_budget()
+
+
+async def _summarize_transcript(
+    transcript: TranscriptInput,
+    key: Optional[str] = None,
+    on_progress: Optional[ProgressCallback] = None,
+) -> str:
+    transcript = _as_segments(transcript)
+    if not _is_long(transcript):
+        return transcript.render()
+
+    key = key or transcript_key(transcript)
+    cached = await _SUMMARY_CACHE.get_async(key)
     if cached:
         return cached
 
-    lock = _SUMMARY_LOCKS.setdefault(key, Lock())
-    with lock:
-        cached = _SUMMARY_CACHE.get(key)
-        if cached:
-            return cached
+    return await _SUMMARY_FLIGHT.do_async(
+        key, lambda: _build_summary(transcript, key, on_progress)
+    )
 
-        # Very long transcripts: do a single-call sampled summary to avoid many LLM calls.
-        if len(transcript) > _MAX_TRANSCRIPT_CHARS * 4:
-            sampled = _sample_text(transcript, _MAX_TRANSCRIPT_CHARS)
-            prompt = f"""Create very detailed study notes in bullet-point format.
-    Use headings with bullet points and sub-bullets. Include definitions, steps, formulas, examples, and key terms.
-    Expand each main bullet with 1-2 supporting sub-bullets. Avoid paragraphs.
 
-Sample:
+async def _build_summary(
+    transcript: SegmentedTranscript, key: str, on_progress: Optional[ProgressCallback] = None
+) -> str:
+    # Very long transcripts: keep the most representative passages locally and
+    # summarize them in one call instead of mapping every chunk.
+    if transcript.rendered_tokens() > _transcript_budget() * EXTRACTIVE_SUMMARY_RATIO:
+        with span(stage="extract"):
+            sampled = await asyncio.to_thread(extract_key_passages, transcript, _transcript_budget())
+        prompt = f"""Create very detailed study notes in bullet-point format.
+Use headings with bullet points and sub-bullets. Include definitions, steps, formulas, examples, and key terms.
+Expand each main bullet with 1-2 supporting sub-bullets. Avoid paragraphs.
+{_TIMESTAMP_RULE}
+Key passages:
 {sampled}
 """
-            result = _ask_groq(prompt)
-            _SUMMARY_CACHE[key] = result
-            return result
-
-        chunks = _chunk_text(transcript, _MAX_TRANSCRIPT_CHARS)
-        if not chunks:
-            return transcript
-
-        summaries: List[str] = []
-        for idx, chunk in enumerate(chunks, start=1):
-            prompt = f"""Summarize chunk {idx}/{len(chunks)} into very detailed study bullets.
+        with span(stage="sample"), _watch_truncation() as cut:
+            result = await _ask_groq(prompt)
+        if not cut:
+            _SUMMARY_CACHE.set(key, result)
+        return result
+
+    with span(stage="chunking"):
+        chunks = transcript.chunks(_chunk_budget())
+    if not chunks:
+        return transcript.render()
+
+    with _watch_truncation() as cut:
+        with span(stage="map"):
+            summaries = await _map_chunks(chunks, on_progress)
+        if on_progress:
+            on_progress("reduce", 0, 1)
+        with span(stage="reduce"):
+            final_summary = await _reduce_summaries(summaries)
+    if not cut:
+        _SUMMARY_CACHE.set(key, final_summary)
+    return final_summary
+
+
+# Timed transcripts carry [mm:ss] markers; headings keep them so notes link back to the video.
+_TIMESTAMP_RULE = "If the text has [mm:ss] markers, start each heading with the marker where that topic begins."
+
+
+def _chunk_prompt(idx: int, total: int, chunk: str) -> str:
+    return f"""Summarize chunk {idx}/{total} into very detailed study bullets.
     Keep definitions, steps, formulas, examples, and key terms. Use sub-bullets. No filler.
+{_TIMESTAMP_RULE}
 
 Text:
 {chunk}
 """
-            summaries.append(_ask_groq(prompt))
 
-        combined = "\n\n".join(summaries).strip()
-        if len(combined) <= _MAX_SUMMARY_CHARS:
-            _SUMMARY_CACHE[key] = combined
-            return combined
 
-        # One more compression pass if needed.
-        compress_prompt = f"""Compress into one clean outline with headings + bullets.
+def _compress_prompt(combined: str) -> str:
+    return f"""Compress into one clean outline with headings + bullets.
 Keep key points; use bullet points only and keep sub-bullets where needed.
+Keep any [mm:ss] markers at the start of headings.
 
 Summaries:
 {combined}
 """
-        final_summary = _ask_groq(compress_prompt)
-        _SUMMARY_CACHE[key] = final_summary
-        return final_summary
 
 
-def generate_notes(transcript: str) -> str:
-    raw_key = hashlib.sha1((transcript or "").encode("utf-8", errors="ignore")).hexdigest()
-    cached = _NOTES_CACHE.get(raw_key)
+async def _summarize_chunk(idx: int, total: int, chunk: Chunk) -> str:
+    key = _text_key(chunk.text)
+    cached = await _CHUNK_SUMMARY_CACHE.get_async(key)
+    if cached:
+        return cached
+    async with _SUMMARY_SEMAPHORE:
+        with _watch_truncation() as cut:
+            summary = await _ask_groq(_chunk_prompt(idx, total, chunk.text), model=GROQ_SUMMARY_MODEL)
+    if not cut:
+        _CHUNK_SUMMARY_CACHE.set(key, summary)
+    return summary
+
+
+async def _compress_summaries(combined: str, model: str = GROQ_SUMMARY_MODEL) -> str:
+    async with _SUMMARY_SEMAPHORE:
+        return await _ask_groq(_compress_prompt(combined), model=model)
+
+
+async def _map_chunks(
+    chunks: List[Chunk], on_progress: Optional[ProgressCallback] = None
+) -> List[str]:
+    total = len(chunks)
+    done = 0
+
+    async def run(idx: int, chunk: Chunk) -> str:
+        nonlocal done
+        summary = await _summarize_chunk(idx, total, chunk)
+        done += 1
+        if on_progress:
+            on_progress("map", done, total)
+        return summary
+
+    # gather returns results in argument order, so chunk order is kept.
+    return list(await asyncio.gather(
+        *(run(idx, chunk) for idx, chunk in enumerate(chunks, start=1))
+    ))
+
+
+async def _reduce_summaries(summaries: List[str]) -> str:
+    combined = "\n\n".join(summaries).strip()
+    if estimate_tokens(combined) <= _summary_budget():
+        return combined
+
+    # Hierarchical reduce: compress groups that fit one prompt until the outline is small.
+    # Intermediate rounds use the summary model; the last one, which becomes
+    # the notes, uses the generation model.
+    for _ in range(4):
+        if estimate_tokens(combined) <= _chunk_budget():
+            return await _compress_summaries(combined, model=GROQ_GENERATION_MODEL)
+
+        groups = _chunk_text(combined, _chunk_budget())
+        if len(groups) <= 1:
+            break
+        compressed = await asyncio.gather(*(_compress_summaries(group) for group in groups))
+        combined = "\n\n".join(compressed).strip()
+        if estimate_tokens(combined) <= _summary_budget():
+            return combined
+
+    return await _compress_summaries(
+        truncate_to_tokens(combined, _chunk_budget()), model=GROQ_GENERATION_MODEL
+    )
+
+
+async def generate_notes(transcript: TranscriptInput, raw_key: Optional[str] = None) -> str:
+    raw_key = raw_key or transcript_key(transcript)
+    cached = await _NOTES_CACHE.get_async(raw_key)
     if cached:
         return cached
 
-    # If transcript is long, the summarizer already produces structured notes.
-    if (transcript or "") and len(transcript) > _MAX_TRANSCRIPT_CHARS:
-        notes = _summarize_transcript(transcript)
-        _NOTES_CACHE[raw_key] = notes
-        return notes
+    return await _NOTES_FLIGHT.do_async(raw_key, lambda: _build_notes(transcript, raw_key))
 
-    transcript = _summarize_transcript(transcript)
-    prompt = f"""Create very detailed study notes in bullet-point format.
+
+async def _build_notes(transcript: TranscriptInput, raw_key: str) -> str:
+    transcript = _as_segments(transcript)
+    with _watch_truncation() as cut:
+        # If transcript is long, the summarizer already produces structured notes.
+        if _is_long(transcript):
+            notes = await _summarize_transcript(transcript, raw_key)
+        else:
+            notes = await _ask_groq(_notes_prompt(transcript.render()))
+    if not cut:
+        _NOTES_CACHE.set(raw_key, notes)
+    return notes
+
+
+def _notes_prompt(transcript: str) -> str:
+    return f"""Create very detailed study notes in bullet-point format.
 Use headings with bullet points and sub-bullets. Include definitions, steps, formulas, examples, and key terms.
 Expand each main bullet with 1-2 supporting sub-bullets. Avoid paragraphs.
+{_TIMESTAMP_RULE}
 
 Transcript:
 {transcript}
 """
-    notes = _ask_groq(prompt)
-    _NOTES_CACHE[raw_key] = notes
-    return notes
 
 
+async def stream_notes(transcript: TranscriptInput) -> AsyncIterator[Tuple[str, dict]]:
+    """Yield (event, data) pairs: progress, delta (text), then done.
 
-def _normalize_flashcards(cards: Any) -> List[dict]:
+    The caller announces the start; a cache hit goes straight to delta.
+    """
+    transcript = _as_segments(transcript)
+    raw_key = transcript_key(transcript)
+    cached = await _NOTES_CACHE.get_async(raw_key)
+    if cached:
+        yield "delta", {"text": cached}
+        yield "done", {"cached": True}
+        return
+
+    if _is_long(transcript):
+        # Long transcripts: the summary is the notes; relay map/reduce progress meanwhile.
+        events: asyncio.Queue = asyncio.Queue()
+        # The task copies this context, so its truncated replies land in ``cut``.
+        with _watch_truncation() as cut:
+            task = asyncio.ensure_future(_summarize_transcript(
+                transcript,
+                raw_key,
+                on_progress=lambda stage, done, total: events.put_nowait((stage, done, total)),
+            ))
+        task.add_done_callback(lambda _: events.put_nowait(None))
+        while (item := await events.get()) is not None:
+            stage, done, total = item
+            yield "progress", {"stage": stage, "done": done, "total": total}
+        notes = await task
+        if not cut:
+            _NOTES_CACHE.set(raw_key, notes)
+        yield "delta", {"text": notes}
+        yield "done", {"cached": False}
+        return
+
+    parts: List[str] = []
+    cut: List[bool] = []
+    async for token in _ask_groq_stream(_notes_prompt(transcript.render()), cut=cut):
+        parts.append(token)
+        yield "delta", {"text": token}
+    notes = "".join(parts).strip()
+    if not cut:
+        _NOTES_CACHE.set(raw_key, notes)
+    yield "done", {"cached": False}
+
+
+
+_TIMESTAMP_RE = re.compile(r"^(?:\d+:)?\d{1,2}:\d{2}$")
+
+
+def _normalize_flashcards(cards: Any, existing: List[dict] = ()) -> List[dict]:
     if not isinstance(cards, list):
         return []
     normalized: List[dict] = []
@@ -264,11 +738,15 @@ def _normalize_flashcards(cards: Any) -> List[dict]:
         question = item.get("question")
         answer = item.get("answer")
         if isinstance(question, str) and isinstance(answer, str):
-            normalized.append({"question": question.strip(), "answer": answer.strip()})
-    return normalized
+            card = {"question": question.strip(), "answer": answer.strip()}
+            timestamp = item.get("timestamp")
+            if isinstance(timestamp, str) and _TIMESTAMP_RE.match(timestamp.strip("[] ")):
+                card["timestamp"] = timestamp.strip("[] ")
+            normalized.append(card)
+    return _new_items(normalized, list(existing))
 
 
-def _normalize_quiz(items: Any) -> List[dict]:
+def _normalize_quiz(items: Any, existing: List[dict] = ()) -> List[dict]:
     if not isinstance(items, list):
         return []
     normalized: List[dict] = []
@@ -289,99 +767,205 @@ def _normalize_quiz(items: Any) -> List[dict]:
             "options": [opt.strip() for opt in options],
             "correct_answer": correct,
         })
-    return normalized
+    return _new_items(normalized, list(existing))
 
 
-def generate_flashcards(transcript: str, count: int = 10):
-    count = max(10, min(count, 20))  # enforce limits
+_FLASHCARD_LIMITS = (10, 20)
+_QUIZ_LIMITS = (5, 10)
 
-    raw_key = hashlib.sha1((transcript or "").encode("utf-8", errors="ignore")).hexdigest()
-    cache_key = f"{raw_key}:{count}"
-    cached = _FLASHCARDS_CACHE.get(cache_key)
-    if cached:
-        return cached
+# Generation rounds per request: the first batch plus targeted top-ups.
+_TOP_UP_ROUNDS = 3
+
+# Room left in generation prompts for the questions a top-up must not repeat.
+_AVOID_TOKENS = 400
+
+
+def _avoid_block(questions: List[str]) -> str:
+    if not questions:
+        return ""
+    listed = truncate_to_tokens("\n".join(f"- {q}" for q in questions), _AVOID_TOKENS)
+    return f"""Return only NEW items. These questions are already covered; do not repeat or rephrase them:
+{listed}
+"""
 
-    transcript = _summarize_transcript(transcript)
 
-    prompt = f"""Generate exactly {count} flashcards as JSON.
+def _new_items(items: List[dict], existing: List[dict]) -> List[dict]:
+    # Drops near-duplicates of existing items and of each other.
+    keep = unique_mask([item["question"] for item in items], [item["question"] for item in existing])
+    return [item for item, kept in zip(items, keep) if kept]
+
+
+async def _top_up(pool: List[dict], count: int, build_prompt, normalize, schema_hint: str) -> List[dict]:
+    # Ask only for the shortfall, listing what exists; stop once a round adds nothing new.
+    for _ in range(_TOP_UP_ROUNDS):
+        shortfall = count - len(pool)
+        if shortfall <= 0:
+            break
+        prompt = build_prompt(shortfall, [item["question"] for item in pool])
+        added = normalize(await _ask_groq_json(prompt, schema_hint), pool)
+        if not added:
+            break
+        pool = pool + added
+    return pool
+
+
+def _take(pool: List[dict], count: int, sample: bool) -> List[dict]:
+    if sample and len(pool) > count:
+        return random.sample(pool, count)
+    return pool[:count]
+
+
+async def generate_flashcards(
+    transcript: TranscriptInput, count: int = 10, raw_key: Optional[str] = None, sample: bool = False
+):
+    count = max(_FLASHCARD_LIMITS[0], min(count, _FLASHCARD_LIMITS[1]))  # enforce limits
+
+    raw_key = raw_key or transcript_key(transcript)
+    pool = await _FLASHCARDS_CACHE.get_async(raw_key) or []
+    if len(pool) < count:
+        pool = await _FLASHCARDS_FLIGHT.do_async(
+            f"{raw_key}:{count}", lambda: _build_flashcards(transcript, count, raw_key)
+        )
+    return _take(pool, count, sample)
+
+
+async def _build_flashcards(transcript: TranscriptInput, count: int, raw_key: str) -> List[dict]:
+    pool = await _FLASHCARDS_CACHE.get_async(raw_key) or []
+    if len(pool) >= count:
+        return pool
+
+    transcript = await _summarize_transcript(transcript, raw_key)
+    schema_hint = """{"items": [
+  {"question": "string", "answer": "string", "timestamp": "mm:ss (optional)"}
+]}"""
+    pool = await _top_up(
+        pool,
+        count,
+        lambda shortfall, existing: _flashcards_prompt(transcript, shortfall, existing),
+        _normalize_flashcards,
+        schema_hint,
+    )
+
+    # Another count may have grown the pool meanwhile; keep both.
+    current = await _FLASHCARDS_CACHE.get_async(raw_key) or []
+    pool = (current + _new_items(pool, current))[:_FLASHCARD_LIMITS[1]]
+    _FLASHCARDS_CACHE.set(raw_key, pool)
+    return pool
+
+
+def _flashcards_prompt(transcript: str, count: int, existing: List[str] = ()) -> str:
+    return f"""Generate exactly {count} flashcards as JSON.
 No filler, avoid repeats, no yes/no.
 Make answers slightly longer with 1-2 sentences of context or example.
-
-Format: [{{"question":"...","answer":"..."}}, ...]
+Set "timestamp" to the nearest preceding [mm:ss] marker; omit it if the text has none.
+{_avoid_block(list(existing))}
+Format: {{"items": [{{"question":"...","answer":"...","timestamp":"mm:ss"}}, ...]}}
 
 Transcript:
 {transcript}
 """
-    schema_hint = """[
-  {"question": "string", "answer": "string"}
-]"""
-    cards = _normalize_flashcards(_ask_groq_json(prompt, schema_hint))
 
-    # If the model returns fewer than requested, ask for the remaining cards.
-    if len(cards) < count:
-        remaining = count - len(cards)
-        followup_prompt = f"""Generate exactly {remaining} NEW flashcards as JSON.
-Return only new cards not already provided. Avoid repeats.
 
-Format: [{{\"question\":\"...\",\"answer\":\"...\"}}, ...]
 
-Transcript:
-{transcript}
-"""
-        more_cards = _normalize_flashcards(_ask_groq_json(followup_prompt, schema_hint))
-        cards.extend(more_cards)
+async def generate_quiz(
+    transcript: TranscriptInput, count: int = 5, raw_key: Optional[str] = None, sample: bool = False
+):
+    count = max(_QUIZ_LIMITS[0], min(count, _QUIZ_LIMITS[1]))  # enforce limits
 
-    cards = cards[:count]
-    _FLASHCARDS_CACHE[cache_key] = cards
-    return cards
+    raw_key = raw_key or transcript_key(transcript)
+    pool = await _QUIZ_CACHE.get_async(raw_key) or []
+    if len(pool) < count:
+        pool = await _QUIZ_FLIGHT.do_async(
+            f"{raw_key}:{count}", lambda: _build_quiz(transcript, count, raw_key)
+        )
+    return _take(pool, count, sample)
 
 
+async def _build_quiz(transcript: TranscriptInput, count: int, raw_key: str) -> List[dict]:
+    pool = await _QUIZ_CACHE.get_async(raw_key) or []
+    if len(pool) >= count:
+        return pool
 
-def generate_quiz(transcript: str, count: int = 5):
-    count = max(5, min(count, 10))  # enforce limits
+    transcript = await _summarize_transcript(transcript, raw_key)
+    schema_hint = """{"items": [
+    {"question": "string", "options": ["string", "string", "string", "string"], "correct_answer": "A"}
+]}"""
+    pool = await _top_up(
+        pool,
+        count,
+        lambda shortfall, existing: _quiz_prompt(transcript, shortfall, existing),
+        _normalize_quiz,
+        schema_hint,
+    )
 
-    raw_key = hashlib.sha1((transcript or "").encode("utf-8", errors="ignore")).hexdigest()
-    cache_key = f"{raw_key}:{count}"
-    cached = _QUIZ_CACHE.get(cache_key)
-    if cached:
-        return cached
+    current = await _QUIZ_CACHE.get_async(raw_key) or []
+    pool = (current + _new_items(pool, current))[:_QUIZ_LIMITS[1]]
+    _QUIZ_CACHE.set(raw_key, pool)
+    return pool
 
-    transcript = _summarize_transcript(transcript)
 
-    prompt = f"""Create exactly {count} MCQs as JSON.
+def _quiz_prompt(transcript: str, count: int, existing: List[str] = ()) -> str:
+    return f"""Create exactly {count} MCQs as JSON.
 
 Rules:
 - Provide 4 answer choices as full text strings.
 - "correct_answer" must be one of "A", "B", "C", "D" indicating which option is correct.
 - Avoid trick questions; keep medium difficulty.
-
-Format: [{{"question":"...","options":["...","...","...","..."],"correct_answer":"A"}}, ...]
+{_avoid_block(list(existing))}
+Format: {{"items": [{{"question":"...","options":["...","...","...","..."],"correct_answer":"A"}}, ...]}}
 
 Transcript:
 {transcript}
 """
-    schema_hint = """[
-    {"question": "string", "options": ["string", "string", "string", "string"], "correct_answer": "A"}
-]"""
-    quiz = _normalize_quiz(_ask_groq_json(prompt, schema_hint))
-
-    if len(quiz) < count:
-        remaining = count - len(quiz)
-        followup_prompt = f"""Create exactly {remaining} NEW MCQs as JSON.
-Return only new questions not already provided. Avoid repeats.
-
-Rules:
-- Provide 4 answer choices as full text strings.
-- "correct_answer" must be one of "A", "B", "C", "D".
-
-Format: [{{"question":"...","options":["...","...","...","..."],"correct_answer":"A"}}, ...]
 
-Transcript:
-{transcript}
-"""
-        more_quiz = _normalize_quiz(_ask_groq_json(followup_prompt, schema_hint))
-        quiz.extend(more_quiz)
 
-    quiz = quiz[:count]
-    _QUIZ_CACHE[cache_key] = quiz
-    return quiz
+async def generate_study_pack(
+    transcript: TranscriptInput,
+    flashcard_count: int = 10,
+    quiz_count: int = 5,
+    outputs: Tuple[str, ...] = ("notes", "flashcards", "quiz"),
+    on_progress: Optional[ProgressCallback] = None,
+) -> dict:
+    transcript = _as_segments(transcript)
+    raw_key = transcript_key(transcript)
+    # Condense once up front; the generators then hit the summary cache.
+    await _summarize_transcript(transcript, raw_key, on_progress)
+
+    generators = {
+        "notes": lambda: generate_notes(transcript, raw_key),
+        "flashcards": lambda: generate_flashcards(transcript, flashcard_count, raw_key),
+        "quiz": lambda: generate_quiz(transcript, quiz_count, raw_key),
+    }
+
+    async def run(name: str):
+        if on_progress:
+            on_progress(name, 0, 1)
+        result = await generators[name]()
+        if on_progress:
+            on_progress(name, 1, 1)
+        return result
+
+    results = await asyncio.gather(*(run(name) for name in outputs))
+    return dict(zip(outputs, results))
+
+
+def clamp_count(kind: str, count: int) -> int:
+    """The number of flashcards or quiz questions a request for ``count`` actually gets."""
+    low, high = _FLASHCARD_LIMITS if kind == "flashcards" else _QUIZ_LIMITS
+    return max(low, min(count, high))
+
+
+def artifact_key(kind: str, raw_key: str, count: Optional[int] = None) -> str:
+    """Content-addressed id of one artifact: its kind, transcript hash and (clamped) size."""
+    if kind == "notes":
+        return f"notes.{raw_key}"
+    return f"{kind}.{raw_key}.{clamp_count(kind, count or 0)}"
+
+
+async def cached_artifact(kind: str, raw_key: str, count: Optional[int] = None) -> Optional[Any]:
+    """An already generated artifact, or None; never calls the LLM."""
+    if kind == "notes":
+        return await _NOTES_CACHE.get_async(raw_key)
+    pool = await (_FLASHCARDS_CACHE if kind == "flashcards" else _QUIZ_CACHE).get_async(raw_key) or []
+    count = clamp_count(kind, count or 0)
+    return pool[:count] if len(pool) >= count else None
@@ -0,0 +1,182 @@
+import asyncio
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from app.config import JOB_QUEUE_MAX, JOB_RETENTION_SECONDS, JOB_WORKERS
+from app.services.groq_service import generate_study_pack
+from app.services.metrics import register_collector
+from app.services.rate_limit import background_priority
+from app.services.transcript_service import fetch_transcript_with_fallback, parse_transcript_text
+
+_TERMINAL = ("done", "error")
+
+
+class JobQueueFull(RuntimeError):
+    pass
+
+
+class Job:
+    def __init__(self, url: Optional[str], transcript: Optional[str], outputs: List[str],
+                 flashcard_count: int, quiz_count: int):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.transcript = transcript
+        self.outputs = outputs
+        self.flashcard_count = flashcard_count
+        self.quiz_count = quiz_count
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.result: Dict[str, object] = {}
+        self.stages: Dict[str, dict] = {
+            stage: {"status": "pending"} for stage in ("fetch", "map", "reduce", *outputs)
+        }
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.version = 0
+        self._changed = asyncio.Event()
+
+    def update_stage(self, stage: str, status: str, **progress) -> None:
+        self.stages[stage] = {"status": status, **progress}
+        self._touch()
+
+    def set_status(self, status: str, error: Optional[str] = None) -> None:
+        self.status = status
+        self.error = error
+        self._touch()
+
+    def _touch(self) -> None:
+        self.updated_at = time.time()
+        self.version += 1
+        # Wake current subscribers, then re-arm for the next change.
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_for_change(self, version: int, timeout: float) -> None:
+        if self.version != version:
+            return
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    @property
+    def finished(self) -> bool:
+        return self.status in _TERMINAL
+
+    def snapshot(self) -> dict:
+        data = {
+            "id": self.id,
+            "status": self.status,
+            "stages": self.stages,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+        if self.error:
+            data["error"] = self.error
+        if self.status == "done":
+            data["result"] = self.result
+        return data
+
+
+class JobQueue:
+    """Bounded in-process worker pool for long-running generation jobs.
+
+    Jobs run at background LLM priority, so interactive requests are served
+    first, and their results land in the regular caches.
+    """
+
+    def __init__(self, workers: int, max_queued: int, retention_seconds: float):
+        self.workers = workers
+        self.retention_seconds = retention_seconds
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=max_queued)
+        self._jobs: Dict[str, Job] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, url: Optional[str], transcript: Optional[str], outputs: List[str],
+               flashcard_count: int = 10, quiz_count: int = 5) -> Job:
+        self._prune()
+        job = Job(url, transcript, outputs, flashcard_count, quiz_count)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull("Too many jobs queued; try again later")
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        by_status: Dict[str, int] = {}
+        for job in self._jobs.values():
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {"queued": self._queue.qsize(), "jobs": by_status}
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.updated_at < cutoff:
+                del self._jobs[job_id]
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                with background_priority():
+                    await self._run(job)
+            except asyncio.CancelledError:
+                job.set_status("error", "Server shutting down")
+                raise
+            except Exception as e:
+                job.set_status("error", str(e))
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.set_status("running")
+
+        job.update_stage("fetch", "running")
+        transcript = parse_transcript_text(job.transcript or "")
+        if not transcript:
+            transcript = await fetch_transcript_with_fallback(job.url)
+        job.transcript = None  # don't pin the raw upload for the job's lifetime
+        job.update_stage("fetch", "done")
+
+        def on_progress(stage: str, done: int, total: int) -> None:
+            job.update_stage(stage, "done" if done >= total else "running", done=done, total=total)
+
+        job.result = await generate_study_pack(
+            transcript,
+            job.flashcard_count,
+            job.quiz_count,
+            outputs=tuple(job.outputs),
+            on_progress=on_progress,
+        )
+        for stage in job.stages:
+            if job.stages[stage]["status"] != "done":
+                job.update_stage(stage, "done")
+        job.set_status("done")
+
+
+JOBS = JobQueue(JOB_WORKERS, JOB_QUEUE_MAX, JOB_RETENTION_SECONDS)
+
+
+def _samples():
+    stats = JOBS.stats()
+    yield "job_queue_depth", "gauge", "Jobs waiting for a worker.", {}, stats["queued"]
+    for status, count in stats["jobs"].items():
+        yield "jobs", "gauge", "Retained jobs by status.", {"status": status}, count
+
+
+register_collector(_samples)
@@ -0,0 +1,175 @@
+import contextlib
+import contextvars
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.config import LOG_REQUESTS, METRICS_ENABLED
+
+# Upper bounds (seconds) shared by every latency histogram.
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+# (metric name, type, help, labels, value) produced by a collector at scrape time.
+Sample = Tuple[str, str, str, Dict[str, object], float]
+
+_lock = threading.Lock()
+_counters: Dict[str, Dict[Labels, float]] = {}
+_histograms: Dict[str, Dict[Labels, List[float]]] = {}
+_help: Dict[str, str] = {}
+_collectors: List[Callable[[], Iterable[Sample]]] = []
+
+# Per-request stage timings, only collected while structured request logs are on.
+_REQUEST_SPANS: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_spans", default=None
+)
+_log = logging.getLogger("studysync.requests")
+if LOG_REQUESTS:
+    # uvicorn only configures its own loggers; without a handler and INFO
+    # level the root logger's WARNING default would drop every line.
+    _log.setLevel(logging.INFO)
+    if not _log.handlers:
+        _handler = logging.StreamHandler()
+        _handler.setFormatter(logging.Formatter("%(message)s"))
+        _log.addHandler(_handler)
+    _log.propagate = False
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, help: str = "", **labels) -> None:
+    if not METRICS_ENABLED:
+        return
+    key = _labels(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+        if help:
+            _help.setdefault(name, help)
+
+
+def observe(name: str, seconds: float, help: str = "", **labels) -> None:
+    if not METRICS_ENABLED:
+        return
+    key = _labels(labels)
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        # Per-bucket counts, then sum and count.
+        values = series.get(key)
+        if values is None:
+            values = series[key] = [0.0] * (len(_BUCKETS) + 2)
+        idx = bisect_left(_BUCKETS, seconds)
+        if idx < len(_BUCKETS):
+            values[idx] += 1
+        values[-2] += seconds
+        values[-1] += 1
+        if help:
+            _help.setdefault(name, help)
+    spans = _REQUEST_SPANS.get()
+    if spans is not None:
+        stage = labels.get("stage") or name
+        spans[stage] = spans.get(stage, 0.0) + seconds
+
+
+@contextlib.contextmanager
+def _span(name: str, labels: Dict[str, object]) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+_NOOP = contextlib.nullcontext()
+
+
+def span(name: str = "stage_seconds", **labels):
+    """Time a block into a histogram: ``with span(stage="chunking"): ...``."""
+    if not METRICS_ENABLED:
+        return _NOOP
+    return _span(name, labels)
+
+
+def register_collector(fn: Callable[[], Iterable[Sample]]) -> None:
+    """Add gauges/counters owned by another module, read at scrape time."""
+    _collectors.append(fn)
+
+
+@contextlib.contextmanager
+def request_log(method: str, path: str) -> Iterator[Dict[str, object]]:
+    """Emit one JSON log line per request with its stage timings (LOG_REQUESTS=1)."""
+    if not LOG_REQUESTS:
+        yield {}
+        return
+    record: Dict[str, object] = {"method": method, "path": path}
+    spans: Dict[str, float] = {}
+    token = _REQUEST_SPANS.set(spans)
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        _REQUEST_SPANS.reset(token)
+        record["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        record["stages_ms"] = {stage: round(seconds * 1000, 1) for stage, seconds in spans.items()}
+        _log.info(json.dumps(record))
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    items = labels.items() if isinstance(labels, dict) else labels
+    inner = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in items
+    )
+    return "{" + inner + "}"
+
+
+def _fmt(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render() -> str:
+    """Everything in the Prometheus text exposition format."""
+    lines: List[str] = []
+    with _lock:
+        counters = {name: dict(series) for name, series in _counters.items()}
+        histograms = {name: {k: list(v) for k, v in series.items()} for name, series in _histograms.items()}
+        helps = dict(_help)
+
+    for name, series in sorted(counters.items()):
+        if name in helps:
+            lines.append(f"# HELP {name} {helps[name]}")
+        lines.append(f"# TYPE {name} counter")
+        for labels, value in series.items():
+            lines.append(f"{name}{_format_labels(labels)} {_fmt(value)}")
+
+    for name, series in sorted(histograms.items()):
+        if name in helps:
+            lines.append(f"# HELP {name} {helps[name]}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, values in series.items():
+            cumulative = 0.0
+            for bound, count in zip(_BUCKETS, values):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', f'{bound:g}'),))} {_fmt(cumulative)}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {_fmt(values[-1])}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {values[-2]:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {_fmt(values[-1])}")
+
+    declared = set()
+    for collect in _collectors:
+        for name, kind, help_text, labels, value in collect():
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{_format_labels(labels)} {_fmt(value)}")
+
+    return "\n".join(lines) + "\n"
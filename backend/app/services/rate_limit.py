@@ -0,0 +1,331 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import re
+import sqlite3
+import threading
+import time
+from typing import Iterator, List, Mapping, Optional, Tuple
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Priority of LLM calls made from the current task; background work opts in
+# with ``background_priority()`` and tasks it spawns inherit it.
+_PRIORITY: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def background_priority() -> Iterator[None]:
+    token = _PRIORITY.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    # Groq sends resets like "7.66s", "2m59.56s" or "120ms"; retry-after is plain seconds.
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _parse_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _header_updates(headers: Optional[Mapping[str, str]]) -> Tuple[Optional[int], float]:
+    """(remaining tokens to cap at, seconds to block) from Groq rate-limit headers."""
+    if not headers:
+        return None, 0.0
+    block = 0.0
+    if _parse_int(headers.get("x-ratelimit-remaining-requests")) == 0:
+        block = _parse_duration(headers.get("x-ratelimit-reset-requests")) or 0.0
+    retry_after = _parse_duration(headers.get("retry-after"))
+    if retry_after:
+        block = max(block, retry_after)
+    return _parse_int(headers.get("x-ratelimit-remaining-tokens")), block
+
+
+class LocalBuckets:
+    """Request and token buckets for one process."""
+
+    # Updates are in-memory and cheap enough to run on the event loop.
+    blocking = False
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._lock = threading.Lock()
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def try_take(self, tokens: int) -> float:
+        """Take one request and ``tokens`` if available; else return seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            wait = max(
+                (1 - self._requests) * 60.0 / self.rpm,
+                (tokens - self._tokens) * 60.0 / self.tpm,
+            )
+            if wait > 0:
+                return wait
+            self._requests -= 1
+            self._tokens -= tokens
+            return 0.0
+
+    def peek(self, tokens: int) -> float:
+        """Seconds until ``tokens`` would be available, without taking anything."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return max(
+                self._blocked_until - now,
+                (1 - self._requests) * 60.0 / self.rpm,
+                (tokens - self._tokens) * 60.0 / self.tpm,
+                0.0,
+            )
+
+    def apply(self, delta: float, cap: Optional[int], block: float) -> None:
+        """Cap tokens at what the server reports, return ``delta`` unused ones, block for ``block`` seconds."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if cap is not None:
+                self._tokens = min(self._tokens, float(cap))
+            self._tokens = min(self.tpm, self._tokens + delta)
+            if block:
+                self._blocked_until = max(self._blocked_until, now + block)
+
+
+class SqliteBuckets:
+    """Buckets kept in a SQLite row so every worker process draws from one quota.
+
+    Every update is a ``BEGIN IMMEDIATE`` transaction that may wait on other
+    workers, so the limiter runs them in a thread.
+    """
+
+    blocking = True
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rate_limits (
+        name TEXT PRIMARY KEY,
+        requests REAL NOT NULL,
+        tokens REAL NOT NULL,
+        updated REAL NOT NULL,
+        blocked_until REAL NOT NULL
+    )
+    """
+
+    def __init__(self, path: str, name: str, rpm: int, tpm: int):
+        self.path = path
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(self._SCHEMA)
+        conn.execute(
+            "INSERT OR IGNORE INTO rate_limits VALUES (?, ?, ?, ?, 0)",
+            (name, float(rpm), float(tpm), time.time()),
+        )
+        # Last state this worker saw, for cheap routing estimates (see peek).
+        self._snapshot = conn.execute(
+            "SELECT requests, tokens, updated, blocked_until FROM rate_limits WHERE name = ?", (name,)
+        ).fetchone()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=2.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _update(self, fn) -> float:
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error:
+            # Fail open: a busy database must not stall every LLM call.
+            return 0.0
+        try:
+            requests, tokens, updated, blocked_until = conn.execute(
+                "SELECT requests, tokens, updated, blocked_until FROM rate_limits WHERE name = ?",
+                (self.name,),
+            ).fetchone()
+            now = time.time()
+            elapsed = max(0.0, now - updated)
+            requests = min(self.rpm, requests + elapsed * self.rpm / 60.0)
+            tokens = min(self.tpm, tokens + elapsed * self.tpm / 60.0)
+            result, requests, tokens, blocked_until = fn(now, requests, tokens, blocked_until)
+            conn.execute(
+                "UPDATE rate_limits SET requests = ?, tokens = ?, updated = ?, blocked_until = ? WHERE name = ?",
+                (requests, tokens, now, blocked_until, self.name),
+            )
+            conn.execute("COMMIT")
+            self._snapshot = (requests, tokens, now, blocked_until)
+            return result
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def try_take(self, tokens: int) -> float:
+        def take(now, requests, available, blocked_until):
+            if now < blocked_until:
+                return blocked_until - now, requests, available, blocked_until
+            wait = max((1 - requests) * 60.0 / self.rpm, (tokens - available) * 60.0 / self.tpm)
+            if wait > 0:
+                return wait, requests, available, blocked_until
+            return 0.0, requests - 1, available - tokens, blocked_until
+
+        return self._update(take)
+
+    def peek(self, tokens: int) -> float:
+        # No I/O: refills the last state seen, which other workers may have drawn down since.
+        requests, available, updated, blocked_until = self._snapshot
+        now = time.time()
+        elapsed = max(0.0, now - updated)
+        requests = min(self.rpm, requests + elapsed * self.rpm / 60.0)
+        available = min(self.tpm, available + elapsed * self.tpm / 60.0)
+        return max(
+            blocked_until - now,
+            (1 - requests) * 60.0 / self.rpm,
+            (tokens - available) * 60.0 / self.tpm,
+            0.0,
+        )
+
+    def apply(self, delta: float, cap: Optional[int], block: float) -> None:
+        def update(now, requests, tokens, blocked_until):
+            if cap is not None:
+                tokens = min(tokens, float(cap))
+            tokens = min(self.tpm, tokens + delta)
+            if block:
+                blocked_until = max(blocked_until, now + block)
+            return 0.0, requests, tokens, blocked_until
+
+        self._update(update)
+
+
+class RateLimiter:
+    """Client-side RPM/TPM limiter with a priority-ordered, FIFO wait queue.
+
+    Callers reserve an estimated token cost before each request, then settle
+    it with the real usage. Server rate-limit headers tighten the local view
+    so bursts from many callers never exceed the quota.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._waiters: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond: Optional[asyncio.Condition] = None
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    async def _call(self, fn, *args):
+        if self.buckets.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def _condition(self) -> asyncio.Condition:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def acquire(self, tokens: int, priority: Optional[int] = None) -> None:
+        priority = _PRIORITY.get() if priority is None else priority
+        # A single request can never need more than a full bucket.
+        tokens = min(tokens, self.buckets.tpm)
+        entry = (priority, next(self._seq))
+        cond = self._condition()
+        started = time.monotonic()
+        waited = False
+        async with cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    delay = None
+                    if self._waiters[0] == entry:
+                        delay = await self._call(self.buckets.try_take, tokens)
+                        if delay <= 0:
+                            heapq.heappop(self._waiters)
+                            cond.notify_all()
+                            break
+                    waited = True
+                    try:
+                        await asyncio.wait_for(cond.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                cond.notify_all()
+                raise
+        if waited:
+            self.waits += 1
+            self.wait_seconds += time.monotonic() - started
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def estimate_wait(self, tokens: int) -> float:
+        """Seconds a new call of ``tokens`` would wait for quota, ignoring the queue."""
+        return self.buckets.peek(min(tokens, self.buckets.tpm))
+
+    async def settle(self, reserved: int, used: Optional[int]) -> None:
+        await self.complete(reserved, used, None)
+
+    async def observe_headers(self, headers: Optional[Mapping[str, str]]) -> None:
+        await self.complete(0, None, headers)
+
+    async def complete(self, reserved: int, used: Optional[int], headers: Optional[Mapping[str, str]]) -> None:
+        """Settle a reservation with real usage and apply the reply's headers in one update."""
+        delta = reserved - used if used is not None else 0
+        cap, block = _header_updates(headers)
+        if delta or cap is not None or block:
+            await self._call(self.buckets.apply, delta, cap, block)
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._waiters),
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+
+def create_limiter(rpm: int, tpm: int, shared_path: Optional[str] = None, name: str = "groq") -> RateLimiter:
+    if shared_path:
+        return RateLimiter(SqliteBuckets(shared_path, name, rpm, tpm))
+    return RateLimiter(LocalBuckets(rpm, tpm))
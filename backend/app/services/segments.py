@@ -0,0 +1,184 @@
+import base64
+import re
+import sys
+import zlib
+from array import array
+from bisect import bisect_right
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from app.services.tokens import estimate_tokens, split_by_tokens
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+# Insert a [mm:ss] marker when this many seconds passed since the last one.
+MARKER_INTERVAL_SECONDS = 60.0
+_MARKER_TOKENS = 5
+
+
+def format_timestamp(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rem = divmod(seconds, 3600)
+    minutes, secs = divmod(rem, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes:02d}:{secs:02d}"
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: float
+    end: float
+
+
+class SegmentedTranscript:
+    """A transcript as one text buffer plus parallel per-segment arrays.
+
+    ``offsets[i]`` is where segment ``i`` begins in ``text``; ``starts`` and
+    ``durations`` are its caption timing in seconds. Arrays keep the timing
+    at a few bytes per segment instead of a Python object per caption.
+    Pasted plain text becomes untimed sentence segments.
+    """
+
+    __slots__ = ("text", "offsets", "starts", "durations", "timed", "_rendered_tokens")
+
+    def __init__(self, text: str, offsets: array, starts: array, durations: array, timed: bool):
+        self.text = text
+        self.offsets = offsets
+        self.starts = starts
+        self.durations = durations
+        self.timed = timed
+        self._rendered_tokens: Optional[int] = None
+
+    @classmethod
+    def from_segments(cls, segments: Iterable[Tuple[float, float, str]]) -> "SegmentedTranscript":
+        """Build from (start, duration, text) triples, e.g. caption cues."""
+        parts: List[str] = []
+        offsets = array("I")
+        starts = array("f")
+        durations = array("f")
+        pos = 0
+        for start, duration, text in segments:
+            text = " ".join(text.split())
+            if not text:
+                continue
+            if parts:
+                pos += 1  # joining space
+            offsets.append(pos)
+            starts.append(start)
+            durations.append(max(0.0, duration))
+            parts.append(text)
+            pos += len(text)
+        return cls(" ".join(parts), offsets, starts, durations, timed=bool(parts))
+
+    @classmethod
+    def from_text(cls, text: str) -> "SegmentedTranscript":
+        text = " ".join((text or "").split())
+        offsets = array("I", [0] if text else [])
+        offsets.extend(match.end() for match in _SENTENCE_RE.finditer(text))
+        zeros = array("f", bytes(4 * len(offsets)))
+        return cls(text, offsets, zeros, array("f", zeros), timed=False)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __bool__(self) -> bool:
+        return bool(self.text)
+
+    def __sizeof__(self) -> int:
+        return (
+            object.__sizeof__(self)
+            + sys.getsizeof(self.text)
+            + sum(sys.getsizeof(a) for a in (self.offsets, self.starts, self.durations))
+        )
+
+    def segment_text(self, i: int) -> str:
+        end = self.offsets[i + 1] - 1 if i + 1 < len(self.offsets) else len(self.text)
+        return self.text[self.offsets[i]:end]
+
+    def time_at(self, char_offset: int) -> float:
+        i = bisect_right(self.offsets, char_offset) - 1
+        return float(self.starts[max(i, 0)]) if len(self.offsets) else 0.0
+
+    def render_range(self, first: int, last: int) -> str:
+        if not self.timed:
+            end = self.offsets[last + 1] - 1 if last + 1 < len(self.offsets) else len(self.text)
+            return self.text[self.offsets[first]:end]
+        parts: List[str] = []
+        next_marker = -1.0
+        for i in range(first, last + 1):
+            start = self.starts[i]
+            if start >= next_marker:
+                parts.append(f"[{format_timestamp(start)}]")
+                next_marker = start + MARKER_INTERVAL_SECONDS
+            parts.append(self.segment_text(i))
+        return " ".join(parts)
+
+    def render(self) -> str:
+        """Text for prompts; timed transcripts get a [mm:ss] marker about once a minute."""
+        if not self.offsets:
+            return ""
+        return self.render_range(0, len(self.offsets) - 1)
+
+    def rendered_tokens(self) -> int:
+        if self._rendered_tokens is None:
+            self._rendered_tokens = estimate_tokens(self.render())
+        return self._rendered_tokens
+
+    def chunks(self, max_tokens: int) -> List[Chunk]:
+        """Pack whole segments into chunks of at most ``max_tokens`` rendered tokens.
+
+        Boundaries are content-defined: a chunk ends after a segment whose own
+        hash hits a cut point, so editing one line only changes the chunk that
+        contains it and the neighbouring chunks keep their cached summaries.
+        """
+        min_tokens = max_tokens // 4
+        # A cut is taken with probability tokens/spacing per segment, so past
+        # min_tokens chunks grow by about ``spacing`` tokens on average.
+        spacing = max(1, max_tokens // 4)
+        chunks: List[Chunk] = []
+        first = 0
+        used = 0
+        next_marker = -1.0
+        for i in range(len(self.offsets)):
+            text = self.segment_text(i)
+            tokens = estimate_tokens(text) + 1
+            if used and used + tokens + (_MARKER_TOKENS if self.timed else 0) > max_tokens:
+                chunks.extend(self._chunk(first, i - 1, max_tokens))
+                first, used, next_marker = i, 0, -1.0
+            if self.timed and self.starts[i] >= next_marker:
+                used += _MARKER_TOKENS
+                next_marker = self.starts[i] + MARKER_INTERVAL_SECONDS
+            used += tokens
+            if used >= min_tokens and zlib.crc32(text.encode("utf-8", "ignore")) % spacing < tokens:
+                chunks.extend(self._chunk(first, i, max_tokens))
+                first, used, next_marker = i + 1, 0, -1.0
+        if first < len(self.offsets):
+            chunks.extend(self._chunk(first, len(self.offsets) - 1, max_tokens))
+        return chunks
+
+    def _chunk(self, first: int, last: int, max_tokens: int) -> List[Chunk]:
+        start = float(self.starts[first])
+        end = float(self.starts[last] + self.durations[last])
+        text = self.render_range(first, last)
+        if first == last and estimate_tokens(text) > max_tokens:
+            # A single oversized segment (e.g. pasted text with no punctuation).
+            return [Chunk(part, start, end) for part in split_by_tokens(text, max_tokens)]
+        return [Chunk(text, start, end)]
+
+    def to_json(self) -> dict:
+        return {
+            "text": self.text,
+            "timed": self.timed,
+            "offsets": base64.b64encode(self.offsets.tobytes()).decode("ascii"),
+            "starts": base64.b64encode(self.starts.tobytes()).decode("ascii"),
+            "durations": base64.b64encode(self.durations.tobytes()).decode("ascii"),
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "SegmentedTranscript":
+        arrays = []
+        for name, code in (("offsets", "I"), ("starts", "f"), ("durations", "f")):
+            arr = array(code)
+            arr.frombytes(base64.b64decode(data[name]))
+            arrays.append(arr)
+        return cls(data["text"], *arrays, timed=bool(data.get("timed")))
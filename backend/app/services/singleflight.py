@@ -0,0 +1,100 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+from app.services.metrics import register_collector
+
+_REGISTRY: List["SingleFlight"] = []
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one computation.
+
+    The first caller for a key runs the work; callers arriving while it is in
+    flight wait for the same result. Works for threads (``do``) and coroutines
+    (``do_async``), which can share keys. Keys are dropped once the call
+    finishes, so nothing accumulates.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.started = 0
+        self.coalesced = 0
+        _REGISTRY.append(self)
+
+    def _join(self, key: Hashable):
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                self.coalesced += 1
+                return fut, False
+            fut = Future()
+            self._calls[key] = fut
+            self.started += 1
+            return fut, True
+
+    def _forget(self, key: Hashable, fut: Future) -> None:
+        with self._lock:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        fut, leader = self._join(key)
+        if not leader:
+            return fut.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            self._forget(key, fut)
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        fut, leader = self._join(key)
+        if leader:
+            # Run as its own task so a disconnecting first caller does not
+            # cancel the work everyone else is waiting on.
+            task = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._settle(key, fut, t))
+        return await asyncio.shield(asyncio.wrap_future(fut))
+
+    def _settle(self, key: Hashable, fut: Future, task: "asyncio.Task") -> None:
+        self._forget(key, fut)
+        if task.cancelled():
+            fut.cancel()
+        elif task.exception() is not None:
+            fut.set_exception(task.exception())
+        else:
+            fut.set_result(task.result())
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            "name": self.name,
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "in_flight": in_flight,
+        }
+
+
+def singleflight_stats() -> List[dict]:
+    return [flight.stats() for flight in _REGISTRY]
+
+
+def _samples():
+    for stats in singleflight_stats():
+        labels = {"flight": stats["name"]}
+        yield "singleflight_started_total", "counter", "Computations started.", labels, stats["started"]
+        yield "singleflight_coalesced_total", "counter", "Calls that joined an in-flight computation.", labels, stats["coalesced"]
+        yield "singleflight_in_flight", "gauge", "Computations currently running.", labels, stats["in_flight"]
+
+
+register_collector(_samples)
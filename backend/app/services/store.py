@@ -0,0 +1,143 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Hashable, Optional
+
+from app.services.segments import SegmentedTranscript
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (namespace, key)
+)
+"""
+
+
+# Expired rows are deleted at startup and then this often by the writer thread.
+_PRUNE_INTERVAL_SECONDS = 600.0
+# Writes waiting for the writer thread; beyond this new writes are dropped.
+_WRITE_QUEUE_MAX = 1000
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, SegmentedTranscript):
+        return {"__segments__": value.to_json()}
+    raise TypeError(f"Cannot store {type(value).__name__}")
+
+
+def _decode(obj: dict) -> Any:
+    if "__segments__" in obj:
+        return SegmentedTranscript.from_json(obj["__segments__"])
+    return obj
+
+
+class SqliteStore:
+    """Compressed JSON blobs in SQLite, shared by every worker process.
+
+    WAL mode lets readers in other processes proceed while one process
+    writes; each thread keeps its own connection. Writes are encoded and
+    committed by one background thread, so ``set`` never blocks its caller
+    on compression or a busy database; ``get`` blocks and belongs off the
+    event loop (see ``CacheNamespace.get_async``).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute(_SCHEMA)
+        self._prune()
+        self._writes: "queue.Queue" = queue.Queue(maxsize=_WRITE_QUEUE_MAX)
+        self._writer = threading.Thread(target=self._write_loop, name="sqlite-store-writer", daemon=True)
+        self._writer.start()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=2.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        try:
+            row = self._conn().execute(
+                "SELECT value, expires_at FROM artifacts WHERE namespace = ? AND key = ?",
+                (namespace, str(key)),
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            return None
+        try:
+            return json.loads(zlib.decompress(value), object_hook=_decode)
+        except (zlib.error, ValueError, TypeError, KeyError):
+            # A corrupt or outdated blob is a miss; the next set overwrites it.
+            return None
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        try:
+            self._writes.put_nowait((namespace, str(key), value, ttl))
+        except queue.Full:
+            # The store is a best-effort accelerator; a backlog must not slow requests.
+            pass
+
+    def flush(self) -> None:
+        """Wait until every queued write has been committed."""
+        self._writes.join()
+
+    def _write_loop(self) -> None:
+        last_prune = time.monotonic()
+        while True:
+            namespace, key, value, ttl = self._writes.get()
+            try:
+                self._write(namespace, key, value, ttl)
+                if time.monotonic() - last_prune >= _PRUNE_INTERVAL_SECONDS:
+                    last_prune = time.monotonic()
+                    self._prune()
+            finally:
+                self._writes.task_done()
+
+    def _write(self, namespace: str, key: str, value: Any, ttl: Optional[float]) -> None:
+        try:
+            blob = zlib.compress(json.dumps(value, ensure_ascii=False, default=_encode).encode("utf-8"))
+        except (TypeError, ValueError):
+            return
+        now = time.time()
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO artifacts (namespace, key, value, created_at, expires_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, blob, now, now + ttl if ttl else None),
+            )
+        except sqlite3.Error:
+            # A locked or full disk must not fail requests.
+            pass
+
+    def _prune(self) -> None:
+        try:
+            self._conn().execute(
+                "DELETE FROM artifacts WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)
+            )
+        except sqlite3.Error:
+            pass
+
+
+def open_store(path: Optional[str]) -> Optional[SqliteStore]:
+    if not path:
+        return None
+    return SqliteStore(path)
@@ -0,0 +1,91 @@
+import re
+from typing import Iterator, List, Tuple
+
+from app.config import GROQ_MAX_REQUEST_TOKENS
+
+# Context windows of the Groq models this service may call.
+MODEL_CONTEXT_TOKENS = {
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "llama3-8b-8192": 8192,
+    "llama3-70b-8192": 8192,
+    "gemma2-9b-it": 8192,
+}
+_DEFAULT_CONTEXT_TOKENS = 8192
+
+# Estimates are not exact, so budgets keep some headroom.
+_SAFETY_MARGIN = 1.1
+
+# Mirrors the BPE pre-tokenizer split used by Llama 3 / tiktoken:
+# contractions, letter runs, up to 3 digits, punctuation runs, whitespace.
+_PIECE_RE = re.compile(r"'(?:[sdmt]|ll|ve|re)| ?[^\W\d_]+| ?\d{1,3}| ?(?:[^\s\w]|_)+|\s+", re.IGNORECASE)
+_CJK_START = 0x2E80
+
+
+def _piece_tokens(piece: str) -> int:
+    if piece.isascii():
+        word = piece.lstrip(" ")
+        if not word:
+            return 1
+        if word[0].isalpha():
+            # Common English words are one token; long or rare ones split every ~8 chars.
+            return 1 + len(word) // 8
+        if word[0].isdigit():
+            return 1
+        # Punctuation/operator runs (code, markup) merge into roughly 2-char tokens.
+        return (len(word) + 1) // 2
+    cjk = sum(1 for ch in piece if ord(ch) >= _CJK_START)
+    # CJK is about one token per character; other scripts about two characters per token.
+    return cjk + (len(piece) - cjk + 1) // 2
+
+
+def _pieces(text: str) -> Iterator[Tuple[int, int, int]]:
+    for match in _PIECE_RE.finditer(text):
+        yield match.start(), match.end(), _piece_tokens(match.group())
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate Llama 3 token count; errs on the high side for unusual text."""
+    if not text:
+        return 0
+    return sum(_piece_tokens(piece) for piece in _PIECE_RE.findall(text))
+
+
+def context_limit(model: str) -> int:
+    return MODEL_CONTEXT_TOKENS.get(model, _DEFAULT_CONTEXT_TOKENS)
+
+
+def prompt_budget(model: str, overhead_tokens: int, reserve_output: int) -> int:
+    """Tokens left for variable input once the template and reply are accounted for.
+
+    Groq also caps a single request by the key's tokens-per-minute limit, which
+    is usually far below the context window, so both limits apply.
+    """
+    limit = min(context_limit(model), GROQ_MAX_REQUEST_TOKENS)
+    return max(256, int((limit - reserve_output) / _SAFETY_MARGIN) - overhead_tokens)
+
+
+def split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    # Hard split at pre-tokenizer piece boundaries; used for sentences that exceed a chunk.
+    parts: List[str] = []
+    start = 0
+    used = 0
+    for piece_start, piece_end, cost in _pieces(text):
+        if used + cost > max_tokens and piece_start > start:
+            parts.append(text[start:piece_start].strip())
+            start = piece_start
+            used = 0
+        used += cost
+    tail = text[start:].strip()
+    if tail:
+        parts.append(tail)
+    return [p for p in parts if p]
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    used = 0
+    for piece_start, _, cost in _pieces(text):
+        if used + cost > max_tokens:
+            return text[:piece_start].rstrip()
+        used += cost
+    return text
@@ -1,46 +1,151 @@
+import asyncio
+import json
 import re
-import time
 import os
 import tempfile
+import threading
+from xml.etree import ElementTree
 from xml.etree.ElementTree import ParseError
-from typing import Optional
-from youtube_transcript_api import (
-    YouTubeTranscriptApi,
-    TranscriptsDisabled,
-    NoTranscriptFound
+from typing import List, Optional
+from app.config import (
+    TRANSCRIPT_CACHE_TTL_SECONDS,
+    TRANSCRIPT_HEDGE_DELAY_SECONDS,
+    TRANSCRIPT_SOURCE_TTL_SECONDS,
+    YTDLP_IN_MEMORY_SUBTITLES,
 )
+from app.services.cache import CACHE
+from app.services.captions import iter_segments
+from app.services.metrics import span
+from app.services.segments import SegmentedTranscript
+from app.services.singleflight import SingleFlight
+
+# Transcripts keep their caption timing so summaries and notes can cite timestamps.
+_TRANSCRIPT_CACHE = CACHE.namespace("segments", ttl=TRANSCRIPT_CACHE_TTL_SECONDS)
+_TRANSCRIPT_FLIGHT = SingleFlight("transcript")
+# Which source ("api" or "ytdlp") last produced each video's transcript.
+_SOURCE_HINTS = CACHE.namespace("transcript_source", ttl=TRANSCRIPT_SOURCE_TTL_SECONDS)
+
+# Smallest and easiest to parse first.
+_SUBTITLE_FORMATS = ("json3", "srv3", "vtt")
+# Pooled client for subtitle tracks; used from worker threads, so it is sync.
+_subtitle_http = None
+_subtitle_http_lock = threading.Lock()
+
+
+def _subtitle_client():
+    global _subtitle_http
+    with _subtitle_http_lock:
+        if _subtitle_http is None:
+            import httpx
+
+            _subtitle_http = httpx.Client(
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+                timeout=httpx.Timeout(20.0, connect=10.0),
+                follow_redirects=True,
+            )
+        return _subtitle_http
+
+
+def _captions_to_segments(lines) -> SegmentedTranscript:
+    # Handles VTT and SRT; drops YouTube's rolling duplicate caption lines.
+    return SegmentedTranscript.from_segments(
+        (start, end - start, text) for start, end, text in iter_segments(lines)
+    )
+
+
+def _json3_to_segments(body: bytes) -> SegmentedTranscript:
+    # YouTube json3: {"events": [{"tStartMs": 0, "dDurationMs": 0, "segs": [{"utf8": "..."}]}]}
+    events = json.loads(body).get("events") or []
+    return SegmentedTranscript.from_segments(
+        (
+            event.get("tStartMs", 0) / 1000,
+            event.get("dDurationMs", 0) / 1000,
+            "".join(seg.get("utf8", "") for seg in event.get("segs") or []),
+        )
+        for event in events
+        if event.get("segs")
+    )
+
+
+def _srv3_to_segments(body: bytes) -> SegmentedTranscript:
+    # YouTube srv3: <timedtext><body><p t=".." d=".."><s>word</s>...</p></body></timedtext>
+    root = ElementTree.fromstring(body)
+    return SegmentedTranscript.from_segments(
+        (int(p.get("t") or 0) / 1000, int(p.get("d") or 0) / 1000, "".join(p.itertext()))
+        for p in root.iter("p")
+    )
+
+
+def _requested_languages(info: dict) -> List[str]:
+    # Prefer English if available; otherwise try whatever exists.
+    requested = []
+    subtitles = info.get("subtitles") or {}
+    auto_subtitles = info.get("automatic_captions") or {}
+    for lang in ("en", "en-US", "en-GB"):
+        if lang in subtitles or lang in auto_subtitles:
+            requested.append(lang)
+
+    if not requested:
+        # Fall back to any available language key (manual first, then auto)
+        requested = list(subtitles.keys())[:1] or list(auto_subtitles.keys())[:1]
+    return requested
+
+
+def _pick_subtitle_track(info: dict, languages: List[str]) -> Optional[dict]:
+    for lang in languages:
+        for source in (info.get("subtitles") or {}, info.get("automatic_captions") or {}):
+            tracks = {t.get("ext"): t for t in source.get(lang) or [] if t.get("url")}
+            for ext in _SUBTITLE_FORMATS:
+                if ext in tracks:
+                    return tracks[ext]
+    return None
+
+
+def _download_subtitle_track(track: dict) -> SegmentedTranscript:
+    headers = track.get("http_headers") or None
+    with _subtitle_client().stream("GET", track["url"], headers=headers) as response:
+        response.raise_for_status()
+        if track["ext"] == "vtt":
+            return _captions_to_segments(response.iter_lines())
+        body = response.read()
+    if track["ext"] == "json3":
+        return _json3_to_segments(body)
+    return _srv3_to_segments(body)
+
 
-_TRANSCRIPT_CACHE = {}
-
-
-def _vtt_to_text(vtt: str) -> str:
-    # Minimal WebVTT parser: drop headers, timestamps, cue indices.
-    lines = []
-    for raw_line in vtt.splitlines():
-        line = raw_line.strip()
-        if not line:
-            continue
-        if line.startswith("WEBVTT"):
-            continue
-        if "-->" in line:
-            continue
-        if re.fullmatch(r"\d+", line):
-            continue
-        if line.startswith("NOTE"):
-            continue
-        lines.append(line)
-
-    text = " ".join(lines)
-    text = re.sub(r"<[^>]+>", " ", text)  # strip tags
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
-
-
-def _fetch_transcript_via_ytdlp(url: str) -> Optional[str]:
+def _fetch_transcript_via_ytdlp(url: str) -> Optional[SegmentedTranscript]:
     try:
         from yt_dlp import YoutubeDL  # type: ignore
     except Exception:
         return None
+    import httpx
+
+    ydl_opts = {"skip_download": True, "quiet": True, "no_warnings": True}
+    with YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+
+    requested = _requested_languages(info)
+    if not requested:
+        return None
+
+    if YTDLP_IN_MEMORY_SUBTITLES:
+        # The info dict already lists each track's URL: fetch it straight into memory.
+        track = _pick_subtitle_track(info, requested)
+        if track:
+            try:
+                transcript = _download_subtitle_track(track)
+                if transcript:
+                    return transcript
+            except (httpx.HTTPError, ValueError, ParseError):
+                pass
+
+    return _download_subtitles_to_disk(url, info.get("id"), requested)
+
+
+def _download_subtitles_to_disk(
+    url: str, video_id: Optional[str], requested: List[str]
+) -> Optional[SegmentedTranscript]:
+    from yt_dlp import YoutubeDL  # type: ignore
 
     with tempfile.TemporaryDirectory(prefix="studysynth_subs_") as tmpdir:
         ydl_opts = {
@@ -50,52 +155,34 @@ def _fetch_transcript_via_ytdlp(url: str) -> Optional[str]:
             "writesubtitles": True,
             "writeautomaticsub": True,
             "subtitlesformat": "vtt",
+            "subtitleslangs": requested,
             "outtmpl": os.path.join(tmpdir, "%(id)s.%(ext)s"),
         }
 
         with YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            video_id = info.get("id")
-
-            # Prefer English if available; otherwise try whatever exists.
-            requested = []
-            subtitles = info.get("subtitles") or {}
-            auto_subtitles = info.get("automatic_captions") or {}
-            for lang in ("en", "en-US", "en-GB"):
-                if lang in subtitles or lang in auto_subtitles:
-                    requested.append(lang)
-
-            if not requested:
-                # Fall back to any available language key (manual first, then auto)
-                requested = list(subtitles.keys())[:1] or list(auto_subtitles.keys())[:1]
-
-            if requested:
-                ydl.params["subtitleslangs"] = requested
-                ydl.download([url])
-            else:
-                return None
-
-            # Find the downloaded .vtt file
-            candidates = []
-            if video_id:
-                candidates.extend(
-                    [
-                        os.path.join(tmpdir, f"{video_id}.{lang}.vtt")
-                        for lang in requested
-                    ]
-                )
-
-            # Fallback: any .vtt in directory
-            for name in os.listdir(tmpdir):
-                if name.lower().endswith(".vtt"):
-                    candidates.append(os.path.join(tmpdir, name))
-
-            for path in candidates:
-                if os.path.exists(path) and os.path.getsize(path) > 0:
-                    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                        text = _vtt_to_text(f.read())
-                    if text:
-                        return text
+            ydl.download([url])
+
+        # Find the downloaded .vtt file
+        candidates = []
+        if video_id:
+            candidates.extend(
+                [
+                    os.path.join(tmpdir, f"{video_id}.{lang}.vtt")
+                    for lang in requested
+                ]
+            )
+
+        # Fallback: any .vtt in directory
+        for name in os.listdir(tmpdir):
+            if name.lower().endswith(".vtt"):
+                candidates.append(os.path.join(tmpdir, name))
+
+        for path in candidates:
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                    transcript = _captions_to_segments(f)
+                if transcript:
+                    return transcript
 
     return None
 
@@ -105,33 +192,43 @@ def extract_video_id(url: str) -> str:
         raise ValueError("Invalid YouTube URL")
     return match.group(1)
 
-def fetch_transcript(url) -> str:
+def _get_transcript_blocking(video_id: str) -> SegmentedTranscript:
+    from youtube_transcript_api import NoTranscriptFound, TranscriptsDisabled, YouTubeTranscriptApi
+
+    # 1️⃣ Try preferred languages first (English)
+    try:
+        transcript = YouTubeTranscriptApi.get_transcript(
+            video_id, languages=["en", "en-US", "en-GB"]
+        )
+    except NoTranscriptFound:
+        # 2️⃣ Fallback: ANY available transcript
+        transcript = YouTubeTranscriptApi.get_transcript(video_id)
+    except TranscriptsDisabled:
+        raise RuntimeError("Transcripts are disabled for this video")
+
+    return SegmentedTranscript.from_segments(
+        (item.get("start", 0.0), item.get("duration", 0.0), item["text"]) for item in transcript
+    )
+
+
+async def fetch_transcript(url) -> SegmentedTranscript:
     url = str(url)
     video_id = extract_video_id(url)
 
     # ✅ Cache hit
-    if video_id in _TRANSCRIPT_CACHE:
-        return _TRANSCRIPT_CACHE[video_id]
+    cached = await _TRANSCRIPT_CACHE.get_async(video_id)
+    if cached:
+        return cached
 
     last_error = None
 
     for attempt in range(3):
         try:
-            # 1️⃣ Try preferred languages first (English)
-            try:
-                transcript = YouTubeTranscriptApi.get_transcript(
-                    video_id, languages=["en", "en-US", "en-GB"]
-                )
-            except NoTranscriptFound:
-                # 2️⃣ Fallback: ANY available transcript
-                transcript = YouTubeTranscriptApi.get_transcript(video_id)
-
-            text = " ".join(item["text"] for item in transcript)
-            _TRANSCRIPT_CACHE[video_id] = text
-            return text
-
-        except TranscriptsDisabled:
-            raise RuntimeError("Transcripts are disabled for this video")
+            # youtube-transcript-api is blocking; keep it off the event loop.
+            with span("transcript_fetch_seconds", source="api"):
+                transcript = await asyncio.to_thread(_get_transcript_blocking, video_id)
+            _TRANSCRIPT_CACHE.set(video_id, transcript)
+            return transcript
 
         except Exception as e:
             message = str(e)
@@ -140,11 +237,11 @@ def fetch_transcript(url) -> str:
             # youtube-transcript-api sometimes fails with an XML parse error when
             # YouTube returns an empty/blocked response body.
             if isinstance(e, ParseError) or "no element found" in last_error:
-                time.sleep(2)
+                await asyncio.sleep(2)
                 continue
 
             if "too many requests" in last_error or "429" in last_error:
-                time.sleep(2)
+                await asyncio.sleep(2)
                 continue
 
             if "no transcript found" in last_error:
@@ -163,36 +260,88 @@ def fetch_transcript(url) -> str:
     )
 
 
-def fetch_transcript_with_fallback(url) -> str:
+async def fetch_transcript_with_fallback(url) -> SegmentedTranscript:
     url = str(url)
     video_id = extract_video_id(url)
 
     # ✅ Cache hit
-    if video_id in _TRANSCRIPT_CACHE:
-        return _TRANSCRIPT_CACHE[video_id]
+    cached = await _TRANSCRIPT_CACHE.get_async(video_id)
+    if cached:
+        return cached
+
+    # Many users pasting the same URL at once share a single fetch.
+    return await _TRANSCRIPT_FLIGHT.do_async(
+        video_id, lambda: _fetch_with_fallback_uncached(url, video_id)
+    )
+
 
+async def _fetch_ytdlp(url: str) -> SegmentedTranscript:
+    with span("transcript_fetch_seconds", source="ytdlp"):
+        transcript = await asyncio.to_thread(_fetch_transcript_via_ytdlp, url)
+    if not transcript:
+        raise RuntimeError("yt-dlp found no subtitles")
+    return transcript
+
+
+async def _fetch_with_fallback_uncached(url: str, video_id: str) -> SegmentedTranscript:
+    # Hedged fetch: give youtube-transcript-api a head start, then race yt-dlp
+    # against it. Videos where yt-dlp won recently skip the head start.
+    sources = {asyncio.create_task(fetch_transcript(url)): "api"}
+    hint = await _SOURCE_HINTS.get_async(video_id)
+    delay = 0 if hint == "ytdlp" else TRANSCRIPT_HEDGE_DELAY_SECONDS
+    ytdlp_started = False
     try:
-        text = fetch_transcript(url)
-        _TRANSCRIPT_CACHE[video_id] = text
-        return text
-    except Exception:
-        # Try yt-dlp subtitles as a fallback when youtube-transcript-api gets blocked.
-        ytdlp_text = _fetch_transcript_via_ytdlp(url)
-        if ytdlp_text:
-            _TRANSCRIPT_CACHE[video_id] = ytdlp_text
-            return ytdlp_text
-
-        raise RuntimeError(
-            "Unable to fetch captions for this video. "
-            "Either captions are not available, or YouTube blocked transcript access. "
-            "Try a different video with captions enabled (English)."
-        )
+        pending = set(sources)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=None if ytdlp_started else delay,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in done:
+                if task.exception() is None:
+                    transcript = task.result()
+                    _TRANSCRIPT_CACHE.set(video_id, transcript)
+                    _SOURCE_HINTS.set(video_id, sources[task])
+                    return transcript
+            if not ytdlp_started:
+                # Hedge delay elapsed or the API already failed.
+                ytdlp_task = asyncio.create_task(_fetch_ytdlp(url))
+                sources[ytdlp_task] = "ytdlp"
+                pending.add(ytdlp_task)
+                ytdlp_started = True
+    finally:
+        # Cancel the loser. A yt-dlp call already running in its thread is
+        # left to finish, but its result is discarded.
+        for task in sources:
+            if not task.done():
+                task.cancel()
 
+    raise RuntimeError(
+        "Unable to fetch captions for this video. "
+        "Either captions are not available, or YouTube blocked transcript access. "
+        "Try a different video with captions enabled (English)."
+    )
 
-def normalize_transcript_text(text: str) -> str:
+
+def parse_transcript_text(text: str) -> SegmentedTranscript:
+    # Pasted VTT/SRT keeps its timing; plain text becomes untimed sentences.
     raw = (text or "").strip()
-    if not raw:
-        return ""
     if "-->" in raw or "WEBVTT" in raw:
-        return _vtt_to_text(raw)
-    return re.sub(r"\s+", " ", raw).strip()
+        return _captions_to_segments(raw.splitlines())
+    return SegmentedTranscript.from_text(raw)
+
+
+def warmup() -> None:
+    """Import the fetchers and open the subtitle client ahead of the first request."""
+    import youtube_transcript_api  # noqa: F401
+
+    _subtitle_client()
+    try:
+        import yt_dlp  # noqa: F401
+    except Exception:
+        pass
+
+
+def normalize_transcript_text(text: str) -> str:
+    return parse_transcript_text(text).text
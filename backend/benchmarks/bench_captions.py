@@ -0,0 +1,97 @@
+"""Compare the streaming caption parser with the original regex-per-line parser.
+
+Run from backend/:  python -m benchmarks.bench_captions [--cues 50000]
+"""
+import argparse
+import random
+import re
+import time
+
+from app.services.captions import captions_to_text
+
+_WORDS = (
+    "the cell membrane controls what enters and leaves while enzymes lower activation "
+    "energy so reactions proceed faster at body temperature and pressure"
+).split()
+
+
+def legacy_vtt_to_text(vtt: str) -> str:
+    # The parser captions_to_text replaced, kept verbatim as the baseline.
+    lines = []
+    for raw_line in vtt.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        if line.startswith("WEBVTT"):
+            continue
+        if "-->" in line:
+            continue
+        if re.fullmatch(r"\d+", line):
+            continue
+        if line.startswith("NOTE"):
+            continue
+        lines.append(line)
+
+    text = " ".join(lines)
+    text = re.sub(r"<[^>]+>", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text
+
+
+def _ts(seconds: float) -> str:
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{int(h):02d}:{int(m):02d}:{s:06.3f}"
+
+
+def youtube_auto_vtt(cues: int, seed: int = 7) -> str:
+    """Rolling auto-captions: each cue shows the previous line plus a new one, then a 10ms hold cue."""
+    rng = random.Random(seed)
+    out = ["WEBVTT", "Kind: captions", "Language: en", ""]
+    prev = ""
+    t = 0.0
+    for _ in range(cues):
+        words = [rng.choice(_WORDS) for _ in range(rng.randint(5, 9))]
+        timed = words[0] + "".join(
+            f"<{_ts(t + 0.2 * i)}><c> {w}</c>" for i, w in enumerate(words[1:], start=1)
+        )
+        line = " ".join(words)
+        out += [f"{_ts(t)} --> {_ts(t + 2)} align:start position:0%", prev or " ", timed, ""]
+        out += [f"{_ts(t + 2)} --> {_ts(t + 2.01)} align:start position:0%", line, " ", ""]
+        prev = line
+        t += 2.01
+    return "\n".join(out)
+
+
+def _best_of(fn, arg, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(arg)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cues", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    vtt = youtube_auto_vtt(args.cues)
+    print(f"input: {len(vtt) / 1e6:.1f} MB, {args.cues} rolling cues")
+
+    legacy_s, legacy_text = _best_of(legacy_vtt_to_text, vtt, args.repeat)
+    new_s, new_text = _best_of(lambda v: captions_to_text(v.splitlines()), vtt, args.repeat)
+    encoded = vtt.encode("utf-8").splitlines()
+    bytes_s, _ = _best_of(captions_to_text, encoded, args.repeat)
+
+    print(f"legacy   {legacy_s * 1000:8.1f} ms  {len(legacy_text):>10,} chars out")
+    print(f"stream   {new_s * 1000:8.1f} ms  {len(new_text):>10,} chars out")
+    print(f"bytes    {bytes_s * 1000:8.1f} ms")
+    print(f"speedup {legacy_s / new_s:.2f}x, output {len(new_text) / len(legacy_text):.2f}x of legacy")
+
+
+if __name__ == "__main__":
+    main()
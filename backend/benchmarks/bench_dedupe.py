@@ -0,0 +1,82 @@
+"""Check and time near-duplicate filtering of flashcard/quiz questions.
+
+Run from backend/:  python -m benchmarks.bench_dedupe [--pool 200]
+
+Exits non-zero if templated but different questions are merged, or plain
+rewordings are kept.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from app.services.dedupe import unique_mask  # noqa: E402
+from benchmarks.load_test import _WORDS  # noqa: E402
+
+# Same template, different subject: every question must be kept.
+DISTINCT = [
+    ["What is the role of DNA?", "What is the role of RNA?", "What is the role of ATP?"],
+    [
+        "Which of the following best describes mitosis?",
+        "Which of the following best describes meiosis?",
+        "Which of the following best describes osmosis?",
+    ],
+    [
+        "What is the function of the nucleus?",
+        "What is the function of the ribosome?",
+        "What is the function of the vacuole?",
+    ],
+    ["What does DNA stand for?", "What does RNA stand for?"],
+    ["What is the role of the nucleus?", "What is the function of the nucleus?"],
+]
+
+# Rewordings of one question: only the first must be kept.
+DUPLICATES = [
+    ["What is osmosis?", "Explain osmosis.", "Define osmosis."],
+    ["What is the role of DNA in cells?", "What role does DNA play in the cell?"],
+    ["Which organelle produces ATP?", "Which organelles produce ATP?"],
+]
+
+
+def check() -> bool:
+    ok = True
+    for group in DISTINCT:
+        mask = unique_mask(group)
+        if not all(mask):
+            ok = False
+            print(f"FAIL merged distinct questions: {[q for q, kept in zip(group, mask) if not kept]}")
+    for group in DUPLICATES:
+        mask = unique_mask(group)
+        if mask != [True] + [False] * (len(group) - 1):
+            ok = False
+            print(f"FAIL kept rewordings: {[q for q, kept in zip(group, mask) if kept]}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pool", type=int, default=200, help="existing questions")
+    parser.add_argument("--batch", type=int, default=20, help="new questions checked against the pool")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    ok = check()
+    print("templated pairs kept, rewordings dropped" if ok else "dedupe check failed")
+
+    rng = random.Random(7)
+    questions = [f"What is the role of {' '.join(rng.sample(_WORDS, 3))}?" for _ in range(args.pool + args.batch)]
+    pool, batch = questions[:args.pool], questions[args.pool:]
+    best = float("inf")
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        unique_mask(batch, pool)
+        best = min(best, time.perf_counter() - started)
+    print(f"{args.batch} new vs {args.pool} existing: {best * 1000:.1f} ms")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Time the extractive pre-summarizer on a synthetic lecture transcript.
+
+Run from backend/:  python -m benchmarks.bench_extractive [--chars 500000]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from app.services.extractive import extract_key_passages  # noqa: E402
+from app.services.segments import SegmentedTranscript  # noqa: E402
+from app.services.tokens import estimate_tokens  # noqa: E402
+from benchmarks.load_test import synthetic_segments  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chars", type=int, default=500_000)
+    parser.add_argument("--budget", type=int, default=3500, help="output budget in tokens")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    transcript = SegmentedTranscript.from_segments(synthetic_segments(args.chars, seed=7))
+    print(f"input: {len(transcript.text):,} chars, {len(transcript):,} caption segments")
+
+    best = float("inf")
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        passages = extract_key_passages(transcript, args.budget)
+        best = min(best, time.perf_counter() - started)
+
+    print(f"extract  {best * 1000:8.1f} ms  {estimate_tokens(passages):,} tokens out of budget {args.budget:,}")
+
+
+if __name__ == "__main__":
+    main()
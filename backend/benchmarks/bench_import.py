@@ -0,0 +1,60 @@
+"""Measure how long importing the app takes (the import part of a cold start).
+
+Run from backend/:  python -m benchmarks.bench_import [--repeat 5]
+
+Each run is a fresh interpreter with ``-X importtime``; GROQ_API_KEY is
+removed so this also checks that importing never requires configuration.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def _run_once() -> dict:
+    env = {k: v for k, v in os.environ.items() if k != "GROQ_API_KEY"}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            cumulative[match.group(4)] = int(match.group(2))
+    return cumulative
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args()
+
+    runs = defaultdict(list)
+    for _ in range(args.repeat):
+        for module, micros in _run_once().items():
+            runs[module].append(micros)
+
+    total = statistics.median(runs["app.main"]) / 1000
+    print(f"import app.main: {total:.1f} ms (median of {args.repeat})")
+    # Top-level packages and app modules, by median cumulative import time.
+    interesting = {
+        module: statistics.median(values) / 1000
+        for module, values in runs.items()
+        if "." not in module or module.startswith("app.")
+    }
+    for module, ms in sorted(interesting.items(), key=lambda kv: -kv[1])[: args.top]:
+        print(f"  {module:<40}{ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Offline load test: the real app and pipeline against a fake Groq and fake YouTube.
+
+Run from backend/:  python -m benchmarks.load_test [--requests 200 --concurrency 16]
+
+Nothing leaves the process: requests go through httpx's ASGI transport,
+the Groq client is replaced by FakeGroq (latency, 429s and broken JSON on
+demand) and transcripts come from a synthetic provider sized 1k-500k chars.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import resource
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Dict, List
+
+# The app reads its config at import time.
+os.environ.setdefault("GROQ_API_KEY", "load-test")
+os.environ.setdefault("STORE_PATH", "")
+
+_WORDS = (
+    "cell membrane enzyme energy reaction protein gene mutation osmosis diffusion respiration "
+    "glucose oxygen ribosome nucleus vacuole chlorophyll light carbon water temperature pressure "
+    "force mass velocity momentum charge current voltage resistance field wave frequency"
+).split()
+
+
+class FakeRateLimit(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("Error code: 429 - rate_limit_exceeded")
+        self.response = SimpleNamespace(headers={"retry-after": f"{retry_after:.2f}"})
+
+
+class FakeGroq:
+    """Stands in for AsyncGroq's ``chat.completions.with_raw_response.create``."""
+
+    def __init__(self, latency: float, jitter: float, rate_limit_rate: float, bad_json_rate: float, seed: int):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.bad_json_rate = bad_json_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.rate_limited = 0
+        self.broken = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(with_raw_response=self))
+
+    async def close(self) -> None:
+        pass
+
+    async def create(self, model: str, messages: List[dict], stream: bool = False, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.rng.gauss(self.latency, self.jitter)))
+        if self.rng.random() < self.rate_limit_rate:
+            self.rate_limited += 1
+            raise FakeRateLimit(retry_after=0.05)
+
+        prompt = messages[-1]["content"]
+        content = self._reply(prompt)
+        prompt_tokens = len(prompt) // 4
+        usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=len(content) // 4,
+            total_tokens=prompt_tokens + len(content) // 4,
+        )
+        headers = {"x-ratelimit-remaining-requests": "1000"}
+        if stream:
+            return SimpleNamespace(headers=headers, parse=lambda: self._stream(content))
+        response = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage
+        )
+        return SimpleNamespace(headers=headers, parse=lambda: response)
+
+    async def _stream(self, content: str):
+        for start in range(0, len(content), 16):
+            delta = SimpleNamespace(content=content[start:start + 16])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+    def _reply(self, prompt: str) -> str:
+        if "JSON" not in prompt:
+            lines = [f"- {' '.join(self.rng.sample(_WORDS, 6))}" for _ in range(12)]
+            return "## Summary\n" + "\n".join(lines)
+        match = re.search(r"exactly (\d+)", prompt)
+        count = int(match.group(1)) if match else 5
+        if "MCQ" in prompt:
+            items = [
+                {
+                    "question": f"Which {' '.join(self.rng.sample(_WORDS, 4))} statement holds?",
+                    "options": [" ".join(self.rng.sample(_WORDS, 3)) for _ in range(4)],
+                    "correct_answer": self.rng.choice("ABCD"),
+                }
+                for _ in range(count)
+            ]
+        else:
+            items = [
+                {
+                    "question": f"How does {' '.join(self.rng.sample(_WORDS, 4))} work?",
+                    "answer": " ".join(self.rng.sample(_WORDS, 12)),
+                }
+                for _ in range(count)
+            ]
+        text = json.dumps({"items": items})
+        if self.rng.random() < self.bad_json_rate:
+            # Truncated mid-element, like a reply cut off at max tokens.
+            self.broken += 1
+            text = "Here you go:\n" + text[: int(len(text) * 0.7)]
+        return text
+
+
+def synthetic_segments(chars: int, seed: int):
+    rng = random.Random(seed)
+    t = 0.0
+    produced = 0
+    while produced < chars:
+        text = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(6, 14))) + "."
+        yield t, 3.0, text
+        produced += len(text) + 1
+        t += 3.0
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run(args) -> None:
+    import httpx
+    from app.main import app
+    from app.services import groq_service, transcript_service
+    from app.services.cache import cache_stats
+    from app.services.groq_pool import POOL
+    from app.services.segments import SegmentedTranscript
+
+    fake = FakeGroq(args.latency_ms / 1000, args.jitter_ms / 1000, args.rate_limit_rate, args.bad_json_rate, args.seed)
+    for member in POOL.members:
+        member.client = fake
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    videos: Dict[str, int] = {}
+    for i in range(args.videos):
+        videos[f"bench{i:06d}"] = sizes[i % len(sizes)]
+
+    def fetch_blocking(video_id: str):
+        time.sleep(args.fetch_ms / 1000)
+        return SegmentedTranscript.from_segments(synthetic_segments(videos[video_id], seed=int(video_id[5:])))
+
+    transcript_service._get_transcript_blocking = fetch_blocking
+    transcript_service._fetch_transcript_via_ytdlp = lambda url: None
+
+    endpoints = [path for path in args.endpoints.split(",")]
+    rng = random.Random(args.seed)
+    plan = [(rng.choice(endpoints), rng.choice(list(videos))) for _ in range(args.requests)]
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    queue: "asyncio.Queue" = asyncio.Queue()
+    for item in plan:
+        queue.put_nowait(item)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+
+        async def worker():
+            while not queue.empty():
+                endpoint, video_id = queue.get_nowait()
+                body = {"url": f"https://www.youtube.com/watch?v={video_id}"}
+                started = time.perf_counter()
+                response = await http.post(f"/api/{endpoint}", json=body)
+                latencies[endpoint].append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors[endpoint] += 1
+
+        rss_before = _rss_mb()
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        rss_after = _rss_mb()
+
+    total = sum(len(v) for v in latencies.values())
+    print(f"{total} requests, concurrency {args.concurrency}, {elapsed:.2f}s, {total / elapsed:.1f} req/s")
+    print(f"{'endpoint':<12}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for endpoint, values in sorted(latencies.items()):
+        print(
+            f"{endpoint:<12}{len(values):>6}"
+            f"{_percentile(values, 50) * 1000:>10.1f}{_percentile(values, 95) * 1000:>10.1f}"
+            f"{_percentile(values, 99) * 1000:>10.1f}{errors[endpoint]:>8}"
+        )
+    print(
+        f"LLM calls {fake.calls} ({fake.calls / max(total, 1):.2f}/request), "
+        f"injected 429s {fake.rate_limited}, broken JSON {fake.broken}"
+    )
+    print(f"JSON outcomes {groq_service.json_stats()}")
+    for member in POOL.stats():
+        print(
+            f"pool {member['member']}: {member['requests']} calls, {member['errors']} errors, "
+            f"latency {member['latency_seconds'] * 1000:.0f} ms, waited {member['wait_seconds']}s"
+        )
+    print(f"RSS {rss_before:.1f} -> {rss_after:.1f} MB (+{rss_after - rss_before:.1f}), cache {cache_stats()['bytes'] / 1e6:.1f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--endpoints", default="notes,flashcards,quiz")
+    parser.add_argument("--videos", type=int, default=12, help="distinct videos; fewer means more cache hits")
+    parser.add_argument("--sizes", default="1000,20000,100000,500000", help="transcript sizes in chars")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--fetch-ms", type=float, default=200, help="fake YouTube fetch time")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.02, help="share of LLM calls answered 429")
+    parser.add_argument("--bad-json-rate", type=float, default=0.1, help="share of JSON replies truncated")
+    parser.add_argument("--keys", type=int, default=1, help="fake API keys in the Groq pool")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    # Unthrottled by default so the harness measures the pipeline, not the quota.
+    os.environ.setdefault("GROQ_RPM", "100000")
+    os.environ.setdefault("GROQ_TPM", "100000000")
+    os.environ.setdefault("GROQ_MAX_REQUEST_TOKENS", "6000")
+    os.environ.setdefault("GROQ_API_KEYS", ",".join(["load-test"] + [f"load-test-{i}" for i in range(1, args.keys)]))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()